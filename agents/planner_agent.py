@@ -1,19 +1,45 @@
 """Planner Agent for breaking down study goals into actionable steps."""
-from google.ai import agent
-from google.generativeai import GenerativeModel
-from typing import Dict, Any, List
+from typing import Dict, Any
+from string import Template
 import config
 from tools.custom_tools import StudyPlannerTool
+from memory.memory_manager import shared_response_cache
+
+# Built once at import; only the goal and preferences vary per call
+STUDY_PLAN_PROMPT = Template("""
+        Create a detailed study plan for the following goal: $goal
+        
+        User preferences: $preferences
+        
+        Please:
+        1. Break down the goal into 3-5 specific learning objectives
+        2. Create a timeline for achieving these objectives
+        3. Suggest daily study activities
+        4. Identify key milestones
+        
+        Use the create_study_plan tool to generate the structured plan.
+        """)
+
+
+# StudyPlannerTool is stateless, so one instance serves every planner
+_study_planner_tool = StudyPlannerTool()
 
 
 class PlannerAgent:
     """Agent that plans study sessions and breaks down goals into steps."""
     
-    def __init__(self, memory_bank=None, session_service=None):
+    _planner_tool = None
+    
+    def __init__(self, memory_bank=None, session_service=None, response_cache=None):
+        # Imported here so importing this module doesn't pull in the Google SDK
+        from google.ai import agent
+        from google.generativeai import GenerativeModel
+        
         self.model = GenerativeModel(config.PLANNER_MODEL)
         self.memory_bank = memory_bank
         self.session_service = session_service
-        self.study_planner_tool = StudyPlannerTool()
+        self.response_cache = response_cache if response_cache is not None else shared_response_cache
+        self.study_planner_tool = _study_planner_tool
         
         # Create agent with planning instructions
         self.agent = agent.Agent(
@@ -38,15 +64,16 @@ class PlannerAgent:
         )
     
     def _create_planner_tool(self):
-        """Create tool wrapper for study planner."""
-        def create_plan(subject: str, goals: List[str], duration_days: int) -> Dict[str, Any]:
-            return self.study_planner_tool.create_study_plan(subject, goals, duration_days)
-        
-        return agent.Tool(
-            name="create_study_plan",
-            description="Create a structured study plan with goals distributed across days",
-            function=create_plan
-        )
+        """Get tool wrapper for study planner, built once and shared by all planners."""
+        if PlannerAgent._planner_tool is None:
+            from google.ai import agent
+            
+            PlannerAgent._planner_tool = agent.Tool(
+                name="create_study_plan",
+                description="Create a structured study plan with goals distributed across days",
+                function=_study_planner_tool.create_study_plan
+            )
+        return PlannerAgent._planner_tool
     
     async def plan_study_session(self, user_goal: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -60,31 +87,33 @@ class PlannerAgent:
             Structured study plan
         """
         # Get user preferences from memory if available
-        user_id = context.get("user_id", "default") if context else "default"
+        user_id = (context or {}).get("user_id", "default")
         preferences = {}
         if self.memory_bank:
+            stored = self.memory_bank.get_user_preferences_bulk(
+                user_id,
+                ["note_format", "study_duration"],
+                {"note_format": "markdown", "study_duration": 7}
+            )
             preferences = {
-                "preferred_format": self.memory_bank.get_user_preference(user_id, "note_format", "markdown"),
-                "study_duration": self.memory_bank.get_user_preference(user_id, "study_duration", 7)
+                "preferred_format": stored["note_format"],
+                "study_duration": stored["study_duration"]
             }
         
-        prompt = f"""
-        Create a detailed study plan for the following goal: {user_goal}
+        prompt = STUDY_PLAN_PROMPT.substitute(goal=user_goal, preferences=preferences)
         
-        User preferences: {preferences}
+        async def generate_plan() -> str:
+            response = await self.agent.run(prompt)
+            return response.text
         
-        Please:
-        1. Break down the goal into 3-5 specific learning objectives
-        2. Create a timeline for achieving these objectives
-        3. Suggest daily study activities
-        4. Identify key milestones
-        
-        Use the create_study_plan tool to generate the structured plan.
-        """
+        # Serve repeated prompts from cache and share identical in-flight calls
+        plan_text = await self.response_cache.get_or_compute(
+            self.response_cache.make_key(prompt),
+            generate_plan
+        )
         
-        response = await self.agent.run(prompt)
         return {
-            "plan": response.text,
+            "plan": plan_text,
             "goal": user_goal,
             "preferences": preferences
         }
@@ -1,19 +1,43 @@
 """Teacher Agent for generating explanations, summaries, and study materials."""
-from google.ai import agent
-from google.generativeai import GenerativeModel
 from typing import Dict, Any
+from string import Template
+import asyncio
 import config
 from tools.custom_tools import NoteGeneratorTool
+from memory.memory_manager import shared_response_cache
+
+# Built once at import; only the topic, level and knowledge vary per call
+TEACH_TOPIC_PROMPT = Template("""
+        Teach the topic: $topic
+        
+        Learning level: $level
+        Existing knowledge: $existing_knowledge
+        
+        Please:
+        1. Provide a clear explanation of the topic
+        2. Break it down into key concepts
+        3. Include examples and applications
+        4. Generate structured study notes using the generate_notes tool
+        
+        Make the explanation engaging and easy to understand.
+        """)
 
 
 class TeacherAgent:
     """Agent that teaches concepts and generates study materials."""
     
-    def __init__(self, memory_bank=None, session_service=None):
+    def __init__(self, memory_bank=None, session_service=None, response_cache=None):
+        # Imported here so importing this module doesn't pull in the Google SDK
+        from google.ai import agent
+        from google.generativeai import GenerativeModel
+        
         self.model = GenerativeModel(config.TEACHER_MODEL)
         self.memory_bank = memory_bank
         self.session_service = session_service
+        self.response_cache = response_cache if response_cache is not None else shared_response_cache
         self.note_generator = NoteGeneratorTool()
+        # Keep references so pending background writes aren't garbage collected
+        self._background_tasks = set()
         
         # Create agent with teaching instructions
         self.agent = agent.Agent(
@@ -40,13 +64,12 @@ class TeacherAgent:
     
     def _create_note_tool(self):
         """Create tool wrapper for note generator."""
-        def generate_notes(topic: str, content: str, format_type: str = "markdown") -> Dict[str, Any]:
-            return self.note_generator.generate_notes(topic, content, format_type)
+        from google.ai import agent
         
         return agent.Tool(
             name="generate_notes",
             description="Generate structured study notes from content. Supports markdown, bullet, and outline formats.",
-            function=generate_notes
+            function=self.note_generator.generate_notes
         )
     
     async def teach_topic(self, topic: str, level: str = "intermediate", context: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -61,43 +84,46 @@ class TeacherAgent:
         Returns:
             Teaching content and generated notes
         """
-        # Get user preferences
-        user_id = context.get("user_id", "default") if context else "default"
+        # Get user preferences and existing knowledge about topic
+        user_id = (context or {}).get("user_id", "default")
         preferred_format = "markdown"
-        if self.memory_bank:
-            preferred_format = self.memory_bank.get_user_preference(user_id, "note_format", "markdown")
-        
-        # Get existing knowledge about topic
         existing_knowledge = {}
         if self.memory_bank:
+            preferred_format = self.memory_bank.get_user_preference(user_id, "note_format", "markdown")
             existing_knowledge = self.memory_bank.get_topic_knowledge(topic)
         
-        prompt = f"""
-        Teach the topic: {topic}
-        
-        Learning level: {level}
-        Existing knowledge: {existing_knowledge}
-        
-        Please:
-        1. Provide a clear explanation of the topic
-        2. Break it down into key concepts
-        3. Include examples and applications
-        4. Generate structured study notes using the generate_notes tool
+        prompt = TEACH_TOPIC_PROMPT.substitute(
+            topic=topic,
+            level=level,
+            existing_knowledge=existing_knowledge
+        )
         
-        Make the explanation engaging and easy to understand.
-        """
+        async def generate_explanation() -> str:
+            response = await self.agent.run(prompt)
+            return response.text
         
-        response = await self.agent.run(prompt)
+        # Serve repeated prompts from cache and share identical in-flight calls
+        explanation = await self.response_cache.get_or_compute(
+            self.response_cache.make_key(prompt),
+            generate_explanation
+        )
         
-        # Store knowledge in memory bank
+        # Store knowledge in memory bank in the background so the disk write
+        # stays off the response path
         if self.memory_bank:
-            self.memory_bank.store_topic_knowledge(topic, {
-                "level": level,
-                "taught_at": context.get("timestamp") if context else None
-            })
+            task = asyncio.create_task(asyncio.to_thread(
+                self.memory_bank.store_topic_knowledge,
+                topic,
+                {
+                    "level": level,
+                    "taught_at": context.get("timestamp") if context else None
+                }
+            ))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
         
         return {
-            "explanation": response.text,
+            "explanation": explanation,
             "topic": topic,
             "level": level,
             "notes_generated": True
@@ -4,26 +4,54 @@ Deploy this to make your agent available online via HTTP API.
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
+from functools import lru_cache
+from contextlib import asynccontextmanager
 import asyncio
+import httpx
+import orjson
 from saferouteai import SafeRouteOrchestrator
+import saferouteai.config as config
 from saferouteai.observability.logger import setup_logger
 
+
+# Session IDs the endpoints fall back to, built at startup to avoid a cold first request
+DEFAULT_SESSION_IDS = ("api_session", "api_batch_session")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client and pre-built orchestrators for the server's lifetime."""
+    app.state.http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+    for session_id in DEFAULT_SESSION_IDS:
+        get_orchestrator(session_id)
+    yield
+    get_orchestrator.cache_clear()
+    await app.state.http_client.aclose()
+
+
 # Setup
 app = FastAPI(
     title="SafeRouteAI API",
     description="Real-Time Route Safety Advisor - Multi-Agent System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS for web apps
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure for production
+    allow_origins=config.CORS_ALLOWED_ORIGINS,  # Set CORS_ALLOWED_ORIGINS for production
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST"),
+    allow_headers=("content-type", "authorization"),
 )
 
 logger = setup_logger("SafeRouteAPI")
@@ -37,12 +65,28 @@ class RouteRequest(BaseModel):
     session_id: Optional[str] = None
 
 
+class RouteEntry(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    start: str
+    destination: str
+
+
 class BatchRouteRequest(BaseModel):
-    routes: list
+    routes: list[RouteEntry]
     route_type: str = "driving-car"
     session_id: Optional[str] = None
 
 
+@lru_cache(maxsize=256)
+def get_orchestrator(session_id: str) -> SafeRouteOrchestrator:
+    """Get a cached orchestrator so agents and model clients are reused per session."""
+    return SafeRouteOrchestrator(
+        session_id=session_id,
+        http_client=getattr(app.state, "http_client", None)
+    )
+
+
 @app.get("/")
 def root():
     """API root endpoint."""
@@ -51,6 +95,7 @@ def root():
         "version": "1.0.0",
         "endpoints": {
             "analyze": "/api/analyze-route",
+            "analyze_stream": "/api/analyze-route/stream",
             "batch": "/api/batch-analyze",
             "health": "/api/health"
         }
@@ -77,9 +122,7 @@ async def analyze_route(request: RouteRequest):
     try:
         logger.info(f"Analyzing route: {request.start} -> {request.destination}")
         
-        orchestrator = SafeRouteOrchestrator(
-            session_id=request.session_id or "api_session"
-        )
+        orchestrator = get_orchestrator(request.session_id or "api_session")
         
         result = await orchestrator.analyze_route_safety(
             start=request.start,
@@ -109,6 +152,29 @@ async def analyze_route(request: RouteRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/analyze-route/stream")
+async def analyze_route_stream(request: RouteRequest):
+    """
+    Analyze a single route, streaming each agent's output as server-sent events.
+    
+    Takes the same request body as /api/analyze-route. Emits one event per
+    pipeline step (route_analysis, safety_data, risk_assessment,
+    route_optimization, safety_alert) followed by a final "complete" event.
+    """
+    logger.info(f"Streaming route analysis: {request.start} -> {request.destination}")
+    orchestrator = get_orchestrator(request.session_id or "api_session")
+    
+    async def event_stream():
+        async for event in orchestrator.stream_route_safety(
+            start=request.start,
+            destination=request.destination,
+            route_type=request.route_type
+        ):
+            yield b"data: " + orjson.dumps(event, default=str, option=config.ORJSON_OPTIONS) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/api/batch-analyze")
 async def batch_analyze(request: BatchRouteRequest):
     """
@@ -122,12 +188,10 @@ async def batch_analyze(request: BatchRouteRequest):
     try:
         logger.info(f"Batch analyzing {len(request.routes)} routes")
         
-        orchestrator = SafeRouteOrchestrator(
-            session_id=request.session_id or "api_batch_session"
-        )
+        orchestrator = get_orchestrator(request.session_id or "api_batch_session")
         
         results = await orchestrator.batch_analyze_routes(
-            routes=request.routes,
+            routes=[route.model_dump() for route in request.routes],
             route_type=request.route_type
         )
         
@@ -162,7 +226,7 @@ async def batch_analyze(request: BatchRouteRequest):
 def get_session_history(session_id: str):
     """Get route analysis history for a session."""
     try:
-        orchestrator = SafeRouteOrchestrator(session_id=session_id)
+        orchestrator = get_orchestrator(session_id)
         history = orchestrator.get_session_history()
         return {
             "success": True,
@@ -175,5 +239,14 @@ def get_session_history(session_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # "auto" selects uvloop and httptools from uvicorn[standard] when installed
+    # (uvloop isn't available on Windows, where asyncio is used instead)
+    uvicorn.run(
+        "api_server:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=config.API_WORKERS
+    )
 
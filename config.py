@@ -15,6 +15,8 @@ EVALUATOR_MODEL = "gemini-2.0-flash-exp"
 # Memory Configuration
 MEMORY_BANK_PATH = "./memory_bank"
 SESSION_STORAGE_PATH = "./sessions"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+MAX_HISTORY = int(os.getenv("MAX_HISTORY", "200"))  # Messages kept per session
 
 # Observability Configuration
 LOG_LEVEL = "INFO"
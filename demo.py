@@ -3,7 +3,9 @@ SafeRouteAI Demo Script
 Demonstrates the multi-agent route safety analysis system.
 """
 import asyncio
+import io
 import json
+import sys
 from datetime import datetime
 from saferouteai import SafeRouteOrchestrator
 from saferouteai.observability.logger import setup_logger
@@ -45,6 +47,13 @@ DEMO_ROUTES = [
     }
 ]
 
+# Routes and request payload for the batch demo, built once at import
+BATCH_DEMO_ROUTES = DEMO_ROUTES[:3]
+BATCH_DEMO_PAYLOAD = [
+    {"start": r["start"], "destination": r["destination"]}
+    for r in BATCH_DEMO_ROUTES
+]
+
 
 def print_section(title: str):
     """Print a formatted section header."""
@@ -55,59 +64,63 @@ def print_section(title: str):
 
 def print_route_analysis(result: dict):
     """Print formatted route analysis results."""
+    # Buffer the report and write it in one call instead of one per line
+    out = io.StringIO()
     if not result.get("success"):
-        print(f"❌ Error: {result.get('error', 'Unknown error')}")
+        print(f"❌ Error: {result.get('error', 'Unknown error')}", file=out)
+        sys.stdout.write(out.getvalue())
         return
     
     summary = result.get("summary", {})
     risk_assessment = result.get("risk_assessment", {})
     alert = result.get("safety_alert", {})
     
-    print(f"\n📍 Route: {summary.get('start')} → {summary.get('destination')}")
-    print(f"   Distance: {summary.get('distance_km', 0):.2f} km")
-    print(f"   Duration: {summary.get('duration_minutes', 0):.2f} minutes")
-    print(f"   Route Type: {summary.get('route_type', 'Unknown')}")
+    print(f"\n📍 Route: {summary.get('start')} → {summary.get('destination')}", file=out)
+    print(f"   Distance: {summary.get('distance_km', 0):.2f} km", file=out)
+    print(f"   Duration: {summary.get('duration_minutes', 0):.2f} minutes", file=out)
+    print(f"   Route Type: {summary.get('route_type', 'Unknown')}", file=out)
     
-    print(f"\n⚠️  Risk Assessment:")
-    print(f"   Risk Score: {summary.get('risk_score', 0):.2f}/10")
-    print(f"   Risk Level: {summary.get('risk_level', 'Unknown')}")
+    print(f"\n⚠️  Risk Assessment:", file=out)
+    print(f"   Risk Score: {summary.get('risk_score', 0):.2f}/10", file=out)
+    print(f"   Risk Level: {summary.get('risk_level', 'Unknown')}", file=out)
     
     # Risk breakdown
     risk_breakdown = risk_assessment.get("risk_breakdown", {})
     if risk_breakdown:
-        print(f"\n   Risk Breakdown:")
+        print(f"\n   Risk Breakdown:", file=out)
         for factor, score in risk_breakdown.items():
-            print(f"     - {factor.capitalize()}: {score:.2f}")
+            print(f"     - {factor.capitalize()}: {score:.2f}", file=out)
     
     # Primary risks
     primary_risks = risk_assessment.get("primary_risks", [])
     if primary_risks:
-        print(f"\n   Primary Concerns:")
+        print(f"\n   Primary Concerns:", file=out)
         for risk in primary_risks:
-            print(f"     - {risk['factor'].capitalize()}: {risk['score']:.2f}")
+            print(f"     - {risk['factor'].capitalize()}: {risk['score']:.2f}", file=out)
     
     # Safety alert
     if alert:
         formatted_alert = alert.get("alert", {})
         if formatted_alert.get("formatted_alert"):
-            print(f"\n📢 Safety Alert:")
-            print(formatted_alert["formatted_alert"])
+            print(f"\n📢 Safety Alert:", file=out)
+            print(formatted_alert["formatted_alert"], file=out)
     
     # Optimization recommendation
     optimization = result.get("route_optimization")
     if optimization and optimization.get("optimization_needed"):
-        print(f"\n🔄 Route Optimization:")
+        print(f"\n🔄 Route Optimization:", file=out)
         if optimization.get("should_use_alternative"):
-            print("   ✅ Alternative route recommended!")
+            print("   ✅ Alternative route recommended!", file=out)
             comparison = optimization.get("comparison", {})
             comp_data = comparison.get("comparison", {})
-            print(f"   Risk Improvement: {optimization.get('risk_improvement', 0):.2f} points")
-            print(f"   Distance Change: {comp_data.get('distance', {}).get('difference_km', 0):.2f} km")
-            print(f"   Time Change: {comp_data.get('time', {}).get('difference_minutes', 0):.2f} minutes")
+            print(f"   Risk Improvement: {optimization.get('risk_improvement', 0):.2f} points", file=out)
+            print(f"   Distance Change: {comp_data.get('distance', {}).get('difference_km', 0):.2f} km", file=out)
+            print(f"   Time Change: {comp_data.get('time', {}).get('difference_minutes', 0):.2f} minutes", file=out)
         else:
-            print("   ℹ️  Alternative route available but not significantly safer")
+            print("   ℹ️  Alternative route available but not significantly safer", file=out)
     
-    print("\n" + "-" * 80)
+    print("\n" + "-" * 80, file=out)
+    sys.stdout.write(out.getvalue())
 
 
 async def demo_single_route():
@@ -135,6 +148,8 @@ async def demo_single_route():
         print(f"\n📊 Session History: {len(history)} routes analyzed")
         for i, entry in enumerate(history[-3:], 1):  # Show last 3
             print(f"   {i}. Risk: {entry.get('risk_score', 0):.2f} - {entry.get('start')} → {entry.get('destination')}")
+    
+    await orchestrator.aclose()
 
 
 async def demo_batch_analysis():
@@ -143,11 +158,11 @@ async def demo_batch_analysis():
     
     orchestrator = SafeRouteOrchestrator(session_id="demo_session_2")
     
-    routes = DEMO_ROUTES[:3]  # Analyze first 3 routes
+    routes = BATCH_DEMO_ROUTES  # Analyze first 3 routes
     print(f"Analyzing {len(routes)} routes in parallel...\n")
     
     results = await orchestrator.batch_analyze_routes(
-        routes=[{"start": r["start"], "destination": r["destination"]} for r in routes],
+        routes=BATCH_DEMO_PAYLOAD,
         route_type="driving-car"
     )
     
@@ -165,6 +180,8 @@ async def demo_batch_analysis():
         print(f"   Total Routes: {stats.get('total_routes_analyzed', 0)}")
         print(f"   Average Risk Score: {stats.get('average_risk_score', 0):.2f}")
         print(f"   High Risk Routes: {stats.get('high_risk_routes', 0)}")
+    
+    await orchestrator.aclose()
 
 
 async def demo_memory_and_preferences():
@@ -204,6 +221,8 @@ async def demo_memory_and_preferences():
         print(f"   {i}. [{entry.get('timestamp', 'Unknown')}] "
               f"Risk: {entry.get('risk_score', 0):.2f} - "
               f"{entry.get('start')} → {entry.get('destination')}")
+    
+    await orchestrator.aclose()
 
 
 async def demo_observability():
@@ -234,6 +253,8 @@ async def demo_observability():
             print(f"     Avg Duration: {op_stats['avg_duration']:.4f}s")
             print(f"     Min Duration: {op_stats['min_duration']:.4f}s")
             print(f"     Max Duration: {op_stats['max_duration']:.4f}s")
+    
+    await orchestrator.aclose()
 
 
 async def main():
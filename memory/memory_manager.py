@@ -1,95 +1,231 @@
 """Memory management system for EduMentor agents."""
-from typing import Dict, List, Any, Optional
-from google.ai import agent
-import json
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Sequence
+import asyncio
+import atexit
+import hashlib
+import mmap
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+import orjson
+import config
+
+
+# memory.json files at least this large are parsed straight from an mmap
+_MMAP_THRESHOLD = 50 * 1024 * 1024
+
+# [epoch second, formatted timestamp] shared by all timestamp writers below
+_now_iso_cache: List[Any] = [0, ""]
+
+
+def _now_iso() -> str:
+    """Current local time as an ISO string, formatted at most once per second."""
+    second = int(time.time())
+    if second != _now_iso_cache[0]:
+        _now_iso_cache[0] = second
+        _now_iso_cache[1] = datetime.fromtimestamp(second).isoformat()
+    return _now_iso_cache[1]
+
+
+def _new_user_entry() -> Dict[str, Any]:
+    """Empty MemoryBank record for a user seen for the first time."""
+    return {"preferences": {}, "history": []}
+
+
+@dataclass(slots=True)
+class Session:
+    """Agent session state."""
+    session_id: str
+    user_id: str
+    created_at: str
+    updated_at: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    conversation_history: deque = field(default_factory=lambda: deque(maxlen=config.MAX_HISTORY))
+    context: Dict[str, Any] = field(default_factory=dict)
+
+
+_SESSION_FIELDS = frozenset(Session.__slots__)
 
 
 class InMemorySessionService:
     """In-memory session service for managing agent sessions."""
     
     def __init__(self):
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.sessions: Dict[str, Session] = {}
     
-    def create_session(self, session_id: str, user_id: str, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+    def create_session(self, session_id: str, user_id: str, metadata: Optional[Dict] = None) -> Session:
         """Create a new session."""
-        session = {
-            "session_id": session_id,
-            "user_id": user_id,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "metadata": metadata or {},
-            "conversation_history": [],
-            "context": {}
-        }
+        now = _now_iso()
+        session = Session(
+            session_id=session_id,
+            user_id=user_id,
+            created_at=now,
+            updated_at=now,
+            metadata=metadata or {}
+        )
         self.sessions[session_id] = session
         return session
     
-    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+    def get_session(self, session_id: str) -> Optional[Session]:
         """Get session by ID."""
         return self.sessions.get(session_id)
     
     def update_session(self, session_id: str, updates: Dict[str, Any]) -> bool:
-        """Update session data."""
-        if session_id not in self.sessions:
+        """Update session data. Keys that aren't Session fields are stored in its context."""
+        session = self.sessions.get(session_id)
+        if session is None:
             return False
-        self.sessions[session_id].update(updates)
-        self.sessions[session_id]["updated_at"] = datetime.now().isoformat()
+        for key, value in updates.items():
+            if key in _SESSION_FIELDS:
+                setattr(session, key, value)
+            else:
+                session.context[key] = value
+        session.updated_at = _now_iso()
         return True
     
     def add_to_history(self, session_id: str, role: str, content: str) -> bool:
-        """Add message to conversation history."""
-        if session_id not in self.sessions:
+        """Add message to conversation history (oldest messages drop off past MAX_HISTORY)."""
+        session = self.sessions.get(session_id)
+        if session is None:
             return False
-        self.sessions[session_id]["conversation_history"].append({
+        session.conversation_history.append({
             "role": role,
             "content": content,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         })
         return True
     
     def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get conversation history."""
-        if session_id not in self.sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             return []
-        history = self.sessions[session_id]["conversation_history"]
+        history = session.conversation_history
         if limit:
-            return history[-limit:]
-        return history
+            # Walk back from the tail so only `limit` entries are touched
+            return list(islice(reversed(history), limit))[::-1]
+        return list(history)
+
+
+# Banks flushed by the exit hook below; held weakly so a bank its owner has
+# dropped can be freed instead of living until exit
+_memory_banks: "weakref.WeakSet[MemoryBank]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_memory_banks():
+    """Write every live bank's pending changes at exit."""
+    for bank in list(_memory_banks):
+        bank.flush()
 
 
 class MemoryBank:
     """Long-term memory bank for storing user preferences and performance."""
     
-    def __init__(self, storage_path: str = "./memory_bank"):
+    def __init__(self, storage_path: str = "./memory_bank", flush_interval: float = 5.0):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
         self.memory_file = self.storage_path / "memory.json"
         self.memory: Dict[str, Any] = self._load_memory()
+        # Mutations may run in worker threads (e.g. asyncio.to_thread); the lock
+        # keeps them from changing self.memory while a flush serializes it
+        self._lock = threading.RLock()
+        
+        # Secondary index rebuilt on load (not persisted): user -> topic -> records,
+        # plus running [sum, count] per topic (None = all topics) for O(1) averages
+        self._perf_by_topic: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self._perf_stats: Dict[str, Dict[Optional[str], List[float]]] = {}
+        for user_id, records in self.memory["performance"].items():
+            for record in records:
+                self._index_performance(user_id, record)
+        
+        # Coalesce mutations: rewrite memory.json flush_interval seconds after
+        # the first unsaved change
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        _memory_banks.add(self)
     
     def _load_memory(self) -> Dict[str, Any]:
         """Load memory from disk."""
+        memory = {"users": {}, "topics": {}, "performance": {}}
         if self.memory_file.exists():
             try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                memory = self._read_memory_file()
             except Exception:
-                return {"users": {}, "topics": {}, "performance": {}}
-        return {"users": {}, "topics": {}, "performance": {}}
+                pass
+        
+        # defaultdicts let mutators insert without a separate membership check;
+        # orjson serializes them like plain dicts
+        memory["users"] = defaultdict(_new_user_entry, memory.get("users", {}))
+        memory["topics"] = defaultdict(dict, memory.get("topics", {}))
+        memory["performance"] = defaultdict(list, memory.get("performance", {}))
+        return memory
+    
+    def _read_memory_file(self) -> Dict[str, Any]:
+        """Parse memory.json from raw bytes, memory-mapping large files instead of copying them."""
+        with open(self.memory_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _MMAP_THRESHOLD:
+                return orjson.loads(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    return orjson.loads(view)
     
     def _save_memory(self):
-        """Save memory to disk."""
-        with open(self.memory_file, 'w', encoding='utf-8') as f:
-            json.dump(self.memory, f, indent=2, ensure_ascii=False)
+        """Save memory to disk atomically, so a crash never leaves a half-written file."""
+        payload = orjson.dumps(self.memory, option=orjson.OPT_INDENT_2)
+        tmp_file = self.memory_file.with_suffix(".json.tmp")
+        
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_file, self.memory_file)
+        
+        # Persist the rename itself (POSIX only; directories can't be opened on Windows)
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(self.storage_path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    
+    def _mark_dirty(self):
+        """Record a mutation and schedule a save (call with the lock held)."""
+        self._dirty = True
+        if self._flush_timer is None:
+            # The pending timer also keeps a dropped bank alive until it has saved
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """Write pending changes to disk."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            self._save_memory()
+            self._dirty = False
     
     def store_user_preference(self, user_id: str, key: str, value: Any):
         """Store user preference."""
-        if user_id not in self.memory["users"]:
-            self.memory["users"][user_id] = {"preferences": {}, "history": []}
-        self.memory["users"][user_id]["preferences"][key] = value
-        self._save_memory()
+        with self._lock:
+            self.memory["users"][user_id]["preferences"][key] = value
+            self._mark_dirty()
     
     def get_user_preference(self, user_id: str, key: str, default: Any = None) -> Any:
         """Get user preference."""
@@ -97,44 +233,60 @@ class MemoryBank:
             return default
         return self.memory["users"][user_id]["preferences"].get(key, default)
     
+    def get_user_preferences_bulk(self, user_id: str, keys: List[str], defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get several user preferences in one lookup, falling back to defaults."""
+        defaults = defaults or {}
+        preferences = self.memory["users"].get(user_id, {}).get("preferences", {})
+        return {key: preferences.get(key, defaults.get(key)) for key in keys}
+    
     def record_performance(self, user_id: str, topic: str, score: float, quiz_id: str):
         """Record user performance on quizzes."""
-        if user_id not in self.memory["performance"]:
-            self.memory["performance"][user_id] = []
-        
         record = {
             "topic": topic,
             "score": score,
             "quiz_id": quiz_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
-        self.memory["performance"][user_id].append(record)
-        self._save_memory()
+        with self._lock:
+            self.memory["performance"][user_id].append(record)
+            self._index_performance(user_id, record)
+            self._mark_dirty()
+    
+    def _index_performance(self, user_id: str, record: Dict[str, Any]):
+        """Add a performance record to the per-topic index and running totals."""
+        topic = record["topic"]
+        self._perf_by_topic.setdefault(user_id, {}).setdefault(topic, []).append(record)
+        
+        user_stats = self._perf_stats.setdefault(user_id, {})
+        for key in (topic, None):
+            totals = user_stats.setdefault(key, [0.0, 0])
+            totals[0] += record["score"]
+            totals[1] += 1
     
     def get_performance_history(self, user_id: str, topic: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get performance history for user."""
         if user_id not in self.memory["performance"]:
             return []
         
-        history = self.memory["performance"][user_id]
+        # Copies, so callers can't change the store or its index
         if topic:
-            return [h for h in history if h["topic"] == topic]
-        return history
+            return list(self._perf_by_topic.get(user_id, {}).get(topic, ()))
+        return list(self.memory["performance"][user_id])
     
     def get_average_score(self, user_id: str, topic: Optional[str] = None) -> float:
         """Get average score for user."""
-        history = self.get_performance_history(user_id, topic)
-        if not history:
+        totals = self._perf_stats.get(user_id, {}).get(topic or None)
+        if not totals:
             return 0.0
-        return sum(h["score"] for h in history) / len(history)
+        return totals[0] / totals[1]
     
     def store_topic_knowledge(self, topic: str, knowledge: Dict[str, Any]):
         """Store knowledge about a topic."""
-        if topic not in self.memory["topics"]:
-            self.memory["topics"][topic] = {}
-        self.memory["topics"][topic].update(knowledge)
-        self.memory["topics"][topic]["last_updated"] = datetime.now().isoformat()
-        self._save_memory()
+        with self._lock:
+            topic_knowledge = self.memory["topics"][topic]
+            topic_knowledge.update(knowledge)
+            topic_knowledge["last_updated"] = _now_iso()
+            self._mark_dirty()
     
     def get_topic_knowledge(self, topic: str) -> Dict[str, Any]:
         """Get stored knowledge about a topic."""
@@ -145,26 +297,101 @@ class ContextCompactor:
     """Context compaction utility for managing conversation context."""
     
     @staticmethod
-    def compact_context(history: List[Dict[str, Any]], max_tokens: int = 2000) -> List[Dict[str, Any]]:
+    def compact_context(history: Sequence[Dict[str, Any]], max_tokens: int = 2000) -> List[Dict[str, Any]]:
         """
         Compact conversation history to fit within token limit.
         Keeps most recent messages and summarizes older ones.
+        Accepts a list or a deque; only the tail is copied.
         """
         if len(history) <= 10:  # Keep all if small
-            return history
+            return list(history)
         
         # Keep most recent 5 messages
-        recent = history[-5:]
+        recent = list(islice(reversed(history), 5))[::-1]
         
-        # Summarize older messages
-        older = history[:-5]
+        # Summarize older messages without copying them
+        older_count = len(history) - 5
         summary = {
             "role": "system",
-            "content": f"Previous conversation summary: {len(older)} messages about various topics.",
-            "timestamp": older[0]["timestamp"] if older else datetime.now().isoformat()
+            "content": f"Previous conversation summary: {older_count} messages about various topics.",
+            "timestamp": history[0]["timestamp"]
         }
         
         return [summary] + recent
 
 
+def _is_error_response(value: Any) -> bool:
+    """Whether a response is the "Error: ..." text agents return when the LLM call fails."""
+    return isinstance(value, str) and value.startswith("Error: ")
+
+
+class ResponseCache:
+    """TTL cache for agent responses keyed on a hash of the canonicalized prompt."""
+    
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        """Hash a prompt with whitespace collapsed so reformatted prompts share a key."""
+        canonical = " ".join(prompt.split())
+        return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get cached response, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any):
+        """Cache a response, evicting the least recently used entry when full."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get cached response, or compute it once for all concurrent callers.
+        
+        Callers arriving while a computation for the same key is in flight
+        await that shared result instead of starting a duplicate LLM call.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._on_computed(key, f))
+        # Shield so one cancelled caller doesn't cancel the call for the others
+        return await asyncio.shield(future)
+    
+    def _on_computed(self, key: str, future: asyncio.Future):
+        """Release the in-flight slot and cache successful results."""
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        # A failed LLM call is shared with the callers already waiting on it,
+        # but not replayed to later ones
+        if not _is_error_response(future.result()):
+            self.set(key, future.result())
+    
+    def clear(self):
+        """Drop all cached responses."""
+        self._entries.clear()
+
 
+# Shared across agent instances so repeated prompts skip the LLM round-trip
+shared_response_cache = ResponseCache(ttl_seconds=config.RESPONSE_CACHE_TTL)
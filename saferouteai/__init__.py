@@ -1,18 +1,30 @@
 """SafeRouteAI - Real-Time Route Safety Advisor."""
-from saferouteai.orchestrator import SafeRouteOrchestrator
-from saferouteai.agents.route_analysis_agent import RouteAnalysisAgent
-from saferouteai.agents.safety_data_agent import SafetyDataAgent
-from saferouteai.agents.risk_scoring_agent import RiskScoringAgent
-from saferouteai.agents.route_optimization_agent import RouteOptimizationAgent
-from saferouteai.agents.alert_agent import AlertAgent
+import importlib
 
 __version__ = "1.0.0"
-__all__ = [
-    "SafeRouteOrchestrator",
-    "RouteAnalysisAgent",
-    "SafetyDataAgent",
-    "RiskScoringAgent",
-    "RouteOptimizationAgent",
-    "AlertAgent"
-]
 
+# Public name -> defining module. Resolved on first access (PEP 562) so that
+# `import saferouteai` doesn't pull in the Google SDK and routing clients.
+_LAZY_EXPORTS = {
+    "SafeRouteOrchestrator": "saferouteai.orchestrator",
+    "RouteAnalysisAgent": "saferouteai.agents.route_analysis_agent",
+    "SafetyDataAgent": "saferouteai.agents.safety_data_agent",
+    "RiskScoringAgent": "saferouteai.agents.risk_scoring_agent",
+    "RouteOptimizationAgent": "saferouteai.agents.route_optimization_agent",
+    "AlertAgent": "saferouteai.agents.alert_agent"
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,56 +1,94 @@
 """Simple Agent wrapper for Google Generative AI models."""
-from google.generativeai import GenerativeModel
-from typing import List, Callable, Dict, Any, Optional
+from typing import List, Callable, Dict, Any, Optional, TYPE_CHECKING
+import asyncio
 import inspect
 import json
 
+if TYPE_CHECKING:
+    from google.generativeai import GenerativeModel
+
+
+# Python annotation -> JSON-schema type for tool parameters
+_TYPE_MAP = {
+    int: "number",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    List: "array",
+    dict: "object",
+    Dict: "object",
+}
+
+# Parameter schemas keyed by code object. Tool factories define a fresh closure
+# per call, but closures from the same def share their code and signature.
+_SCHEMA_CACHE: Dict[Any, Dict[str, Any]] = {}
+
+
+def _build_parameters(function: Callable) -> Dict[str, Any]:
+    """Build the JSON-schema parameter spec for a tool function."""
+    sig = inspect.signature(function)
+    parameters = {
+        "type": "object",
+        "properties": {},
+        "required": []
+    }
+    
+    for param_name, param in sig.parameters.items():
+        if param_name == "self":
+            continue
+        annotation = param.annotation
+        if annotation is inspect.Parameter.empty:
+            param_type = "string"
+        else:
+            param_type = _TYPE_MAP.get(annotation, "string")
+        
+        parameters["properties"][param_name] = {
+            "type": param_type,
+            "description": f"Parameter {param_name}"
+        }
+        
+        if param.default == inspect.Parameter.empty:
+            parameters["required"].append(param_name)
+    
+    return parameters
+
+
+def _get_parameters(function: Callable) -> Dict[str, Any]:
+    """Get the (shared, read-only) parameter spec for a tool function, building it once."""
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return _build_parameters(function)
+    
+    parameters = _SCHEMA_CACHE.get(code)
+    if parameters is None:
+        parameters = _SCHEMA_CACHE[code] = _build_parameters(function)
+    return parameters
+
 
 class Tool:
     """Tool wrapper for agent function calling."""
     
+    __slots__ = ("name", "description", "function", "parameters")
+    
     def __init__(self, name: str, description: str, function: Callable):
         self.name = name
         self.description = description
         self.function = function
         
         # Extract function signature for tool definition
-        sig = inspect.signature(function)
-        self.parameters = {
-            "type": "object",
-            "properties": {},
-            "required": []
-        }
-        
-        for param_name, param in sig.parameters.items():
-            if param_name == "self":
-                continue
-            param_type = "string"
-            if param.annotation != inspect.Parameter.empty:
-                if param.annotation in (int, float):
-                    param_type = "number"
-                elif param.annotation == bool:
-                    param_type = "boolean"
-                elif param.annotation == list or param.annotation == List:
-                    param_type = "array"
-                elif param.annotation == dict or param.annotation == Dict:
-                    param_type = "object"
-            
-            self.parameters["properties"][param_name] = {
-                "type": param_type,
-                "description": f"Parameter {param_name}"
-            }
-            
-            if param.default == inspect.Parameter.empty:
-                self.parameters["required"].append(param_name)
+        self.parameters = _get_parameters(function)
 
 
 class Agent:
     """Simple Agent wrapper using GenerativeModel."""
     
-    def __init__(self, model: GenerativeModel, instructions: str = "", tools: List[Tool] = None):
+    __slots__ = ("model", "instructions", "tools", "_tool_functions", "_instr_prefix")
+    
+    def __init__(self, model: "GenerativeModel", instructions: str = "", tools: List[Tool] = None):
         self.model = model
         self.instructions = instructions
         self.tools = tools or []
+        self._instr_prefix = f"{self.instructions}\n\n"
         
         # Convert tools to function calling format if available
         if self.tools and hasattr(self.model, 'generate_content'):
@@ -59,12 +97,16 @@ class Agent:
     
     async def run(self, prompt: str) -> 'AgentResponse':
         """Run the agent with a prompt."""
-        full_prompt = f"{self.instructions}\n\n{prompt}"
+        full_prompt = self._instr_prefix + prompt
         
         try:
-            # Use generate_content (synchronous but we're in async context)
+            # Prefer the native async API so concurrent agent calls overlap;
+            # fall back to a worker thread for models that only expose the blocking call.
             # In a full implementation, we'd use function calling here
-            response = self.model.generate_content(full_prompt)
+            if hasattr(self.model, 'generate_content_async'):
+                response = await self.model.generate_content_async(full_prompt)
+            else:
+                response = await asyncio.to_thread(self.model.generate_content, full_prompt)
             text = response.text if hasattr(response, 'text') else str(response)
             return AgentResponse(text)
         except Exception as e:
@@ -75,6 +117,8 @@ class Agent:
 class AgentResponse:
     """Response wrapper for agent output."""
     
+    __slots__ = ("text",)
+    
     def __init__(self, text: str):
         self.text = text
     
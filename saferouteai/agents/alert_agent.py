@@ -1,16 +1,173 @@
 """Alert Agent for SafeRouteAI - provides human-readable safety guidance."""
 from saferouteai.agents.agent_wrapper import Agent, Tool
-from google.generativeai import GenerativeModel
-from typing import Dict, Any
+from typing import Dict, Any, List
 import saferouteai.config as config
+import asyncio
 from datetime import datetime
 
 
+# Safety actions per severity; immutable, so alerts share them by reference
+_HIGH_ACTIONS = (
+    "Consider delaying travel if possible",
+    "Use alternative route if available",
+    "Travel with others if necessary",
+    "Stay alert and avoid distractions"
+)
+_MED_ACTIONS = (
+    "Be aware of your surroundings",
+    "Stay in well-lit areas",
+    "Keep phone charged and accessible",
+    "Consider alternative route if convenient"
+)
+_LOW_ACTIONS = (
+    "Standard safety precautions apply",
+    "Stay aware of changing conditions"
+)
+
+# Risk level -> (severity, icon, urgency, message, actions)
+_SEVERITY = {
+    "Hazardous": (
+        "high",
+        "⚠️",
+        "immediate",
+        "⚠️ HIGH RISK ALERT: This route has significant safety concerns.",
+        _HIGH_ACTIONS
+    ),
+    "Moderate": (
+        "medium",
+        "⚡",
+        "caution",
+        "⚡ MODERATE RISK: Exercise caution on this route.",
+        _MED_ACTIONS
+    ),
+    "Safe": (
+        "low",
+        "✅",
+        "informational",
+        "✅ Route appears safe for travel.",
+        _LOW_ACTIONS
+    )
+}
+
+# Pre-rendered "Safety Actions" block per risk level
+_ACTIONS_BLOCK = {
+    level: "\n".join(f"• {action}" for action in preset[4])
+    for level, preset in _SEVERITY.items()
+}
+
+_ALERT_PROMPT_TMPL = """
+        Generate a comprehensive safety alert for the user based on:
+        
+        Risk Assessment:
+        - Risk Level: {risk_level}
+        - Risk Score: {risk_score}/10
+        - Primary Risks: {primary_factors}
+        - Recommendation: {recommendation}
+        
+        {optimization_note}
+        
+        Create a clear, actionable safety alert that:
+        1. Explains the risk in plain language
+        2. Identifies specific concerns (weather, crime, lighting, time)
+        3. Provides practical safety advice
+        4. Recommends next steps
+        5. Is easy to understand and act upon
+        
+        Format the alert as a user-friendly message.
+        """
+
+
+def format_alert(
+    risk_level: str,
+    risk_score: float,
+    primary_risks: list,
+    recommendation: str,
+    route_info: Dict[str, Any] = None
+) -> Dict[str, Any]:
+    """
+    Format safety alert with appropriate severity and messaging.
+    
+    Args:
+        risk_level: Risk level (Safe, Moderate, Hazardous)
+        risk_score: Numeric risk score (0-10)
+        primary_risks: List of primary risk factors
+        recommendation: General recommendation
+        route_info: Optional route information
+    
+    Returns:
+        Formatted alert with severity, message, and actions
+    """
+    # Look up alert severity preset (unknown levels fall back to Safe)
+    risk_level_key = risk_level if risk_level in _SEVERITY else "Safe"
+    severity, icon, urgency, message, actions = _SEVERITY[risk_level_key]
+    
+    # Build risk factors list
+    risk_factors_text = ", ".join(
+        f"{r['factor']} (score: {r['score']})"
+        for r in primary_risks
+    )
+    
+    # Add route-specific info if available
+    route_details = ""
+    if route_info:
+        distance = route_info.get("distance_km", 0)
+        duration = route_info.get("duration_minutes", 0)
+        route_details = f"\nRoute: {distance} km, ~{duration} minutes"
+    
+    return {
+        "success": True,
+        "severity": severity,
+        "urgency": urgency,
+        "icon": icon,
+        "message": message,
+        "risk_score": risk_score,
+        "risk_level": risk_level,
+        "risk_factors": risk_factors_text,
+        "primary_risks": primary_risks,
+        "recommendation": recommendation,
+        "actions": actions,
+        "route_details": route_details,
+        "timestamp": datetime.now().isoformat(),
+        "formatted_alert": f"""
+{message}
+
+Risk Score: {risk_score}/10 ({risk_level})
+Primary Concerns: {risk_factors_text}
+{route_details}
+
+Recommendation: {recommendation}
+
+Safety Actions:
+{_ACTIONS_BLOCK[risk_level_key]}
+        """.strip()
+    }
+
+
+def _optimization_note(optimization_result: Dict[str, Any] = None) -> str:
+    """Describe the recommended alternative route, or "" when there isn't one."""
+    if not (
+        optimization_result
+        and optimization_result.get("optimization_needed")
+        and optimization_result.get("should_use_alternative")
+    ):
+        return ""
+    comparison = optimization_result['comparison']['comparison']
+    return f"""Alternative Route Available:
+An alternative route has been identified that may be safer:
+- Risk improvement: {optimization_result.get('risk_improvement', 0):.2f} points
+- Distance difference: {comparison['distance']['difference_km']:.2f} km
+- Time difference: {comparison['time']['difference_minutes']:.2f} minutes
+
+{optimization_result.get('recommendation', '')}"""
+
+
 class AlertAgent:
     """Agent that generates clear, human-readable safety alerts and guidance."""
     
     def __init__(self):
+        from google.generativeai import GenerativeModel
         self.model = GenerativeModel(config.ALERT_MODEL)
+        self._alert_tool = self._create_alert_formatter_tool()
         
         self.agent = Agent(
             model=self.model,
@@ -31,110 +188,11 @@ class AlertAgent:
             
             Always prioritize user safety and clarity.
             """,
-            tools=[self._create_alert_formatter_tool()]
+            tools=[self._alert_tool]
         )
     
     def _create_alert_formatter_tool(self):
         """Create tool for formatting alerts."""
-        def format_alert(
-            risk_level: str,
-            risk_score: float,
-            primary_risks: list,
-            recommendation: str,
-            route_info: Dict[str, Any] = None
-        ) -> Dict[str, Any]:
-            """
-            Format safety alert with appropriate severity and messaging.
-            
-            Args:
-                risk_level: Risk level (Safe, Moderate, Hazardous)
-                risk_score: Numeric risk score (0-10)
-                primary_risks: List of primary risk factors
-                recommendation: General recommendation
-                route_info: Optional route information
-            
-            Returns:
-                Formatted alert with severity, message, and actions
-            """
-            # Determine alert severity
-            if risk_level == "Hazardous":
-                severity = "high"
-                icon = "⚠️"
-                urgency = "immediate"
-            elif risk_level == "Moderate":
-                severity = "medium"
-                icon = "⚡"
-                urgency = "caution"
-            else:
-                severity = "low"
-                icon = "✅"
-                urgency = "informational"
-            
-            # Build risk factors list
-            risk_factors_text = ", ".join([
-                f"{r['factor']} (score: {r['score']})"
-                for r in primary_risks
-            ])
-            
-            # Generate alert message
-            if severity == "high":
-                message = f"{icon} HIGH RISK ALERT: This route has significant safety concerns."
-                actions = [
-                    "Consider delaying travel if possible",
-                    "Use alternative route if available",
-                    "Travel with others if necessary",
-                    "Stay alert and avoid distractions"
-                ]
-            elif severity == "medium":
-                message = f"{icon} MODERATE RISK: Exercise caution on this route."
-                actions = [
-                    "Be aware of your surroundings",
-                    "Stay in well-lit areas",
-                    "Keep phone charged and accessible",
-                    "Consider alternative route if convenient"
-                ]
-            else:
-                message = f"{icon} Route appears safe for travel."
-                actions = [
-                    "Standard safety precautions apply",
-                    "Stay aware of changing conditions"
-                ]
-            
-            # Add route-specific info if available
-            route_details = ""
-            if route_info:
-                distance = route_info.get("distance_km", 0)
-                duration = route_info.get("duration_minutes", 0)
-                route_details = f"\nRoute: {distance} km, ~{duration} minutes"
-            
-            return {
-                "success": True,
-                "severity": severity,
-                "urgency": urgency,
-                "icon": icon,
-                "message": message,
-                "risk_score": risk_score,
-                "risk_level": risk_level,
-                "risk_factors": risk_factors_text,
-                "primary_risks": primary_risks,
-                "recommendation": recommendation,
-                "actions": actions,
-                "route_details": route_details,
-                "timestamp": datetime.now().isoformat(),
-                "formatted_alert": f"""
-{message}
-
-Risk Score: {risk_score}/10 ({risk_level})
-Primary Concerns: {risk_factors_text}
-{route_details}
-
-Recommendation: {recommendation}
-
-Safety Actions:
-{chr(10).join(f"• {action}" for action in actions)}
-                """.strip()
-            }
-        
         return Tool(
             name="format_alert",
             description="Format safety alert with appropriate severity, message, and actions",
@@ -167,9 +225,21 @@ Safety Actions:
         if route_data:
             route_info = route_data.get("route_data", {})
         
+        # Generate detailed guidance
+        optimization_note = _optimization_note(optimization_result)
+        if optimization_note:
+            optimization_note = f"\n                \n{optimization_note}\n                "
+        
+        prompt = _ALERT_PROMPT_TMPL.format(
+            risk_level=risk_level,
+            risk_score=risk_score,
+            primary_factors=[r['factor'] for r in primary_risks],
+            recommendation=recommendation,
+            optimization_note=optimization_note
+        )
+        
         # Format alert
-        alert_tool = self._create_alert_formatter_tool()
-        formatted_alert = alert_tool.function(
+        formatted_alert = format_alert(
             risk_level,
             risk_score,
             primary_risks,
@@ -177,42 +247,6 @@ Safety Actions:
             route_info
         )
         
-        # Generate detailed guidance
-        optimization_note = ""
-        if optimization_result and optimization_result.get("optimization_needed"):
-            if optimization_result.get("should_use_alternative"):
-                optimization_note = f"""
-                
-Alternative Route Available:
-An alternative route has been identified that may be safer:
-- Risk improvement: {optimization_result.get('risk_improvement', 0):.2f} points
-- Distance difference: {optimization_result['comparison']['comparison']['distance']['difference_km']:.2f} km
-- Time difference: {optimization_result['comparison']['comparison']['time']['difference_minutes']:.2f} minutes
-
-{optimization_result.get('recommendation', '')}
-                """
-        
-        prompt = f"""
-        Generate a comprehensive safety alert for the user based on:
-        
-        Risk Assessment:
-        - Risk Level: {risk_level}
-        - Risk Score: {risk_score}/10
-        - Primary Risks: {[r['factor'] for r in primary_risks]}
-        - Recommendation: {recommendation}
-        
-        {optimization_note if optimization_note else ''}
-        
-        Create a clear, actionable safety alert that:
-        1. Explains the risk in plain language
-        2. Identifies specific concerns (weather, crime, lighting, time)
-        3. Provides practical safety advice
-        4. Recommends next steps
-        5. Is easy to understand and act upon
-        
-        Format the alert as a user-friendly message.
-        """
-        
         response = await self.agent.run(prompt)
         
         return {
@@ -222,6 +256,47 @@ An alternative route has been identified that may be safer:
             "optimization_available": optimization_result is not None and optimization_result.get("optimization_needed", False)
         }
     
+    def annotate_with_optimization(
+        self,
+        alert_result: Dict[str, Any],
+        optimization_result: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Add route optimization details to an alert generated without them.
+        
+        Lets the alert be generated while the optimization is still running;
+        this final step is local and cheap.
+        
+        Args:
+            alert_result: Result of generate_alert called without optimization_result
+            optimization_result: Optional optimization result from RouteOptimizationAgent
+        
+        Returns:
+            The alert, with the alternative route appended to the guidance when one is recommended
+        """
+        if not (optimization_result and optimization_result.get("optimization_needed")):
+            return alert_result
+        
+        annotated = {**alert_result, "optimization_available": True}
+        optimization_note = _optimization_note(optimization_result)
+        if optimization_note:
+            annotated["detailed_guidance"] = f"{alert_result['detailed_guidance']}\n\n{optimization_note}"
+        return annotated
+    
+    async def batch_generate(self, assessments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate alerts for several risk assessments concurrently.
+        
+        Args:
+            assessments: Risk assessments from RiskScoringAgent
+        
+        Returns:
+            Formatted safety alerts, in the same order as assessments
+        """
+        return await asyncio.gather(
+            *(self.generate_alert(assessment) for assessment in assessments)
+        )
+    
     def get_agent(self):
         """Get the underlying agent instance."""
         return self.agent
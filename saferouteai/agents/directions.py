@@ -0,0 +1,389 @@
+"""Shared OpenRouteService directions helpers for SafeRouteAI route agents."""
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional, Tuple
+import asyncio
+import math
+import re
+import sqlite3
+import time
+import numpy as np
+import openrouteservice
+import orjson
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+import saferouteai.config as config
+
+# Coordinates are rounded to 5 decimals (~1 m) before keying the cache
+COORD_PRECISION = 5
+
+# "lat,lon" input, e.g. "40.7128,-74.0060"
+COORD_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+# ORS alternative_routes settings used when alternatives are requested
+ALTERNATIVE_ROUTES = {"target_count": 3, "share_factor": 0.6, "weight_factor": 1.4}
+
+# Side of the square grid cells high-risk points are snapped to for avoid polygons
+# (0.005 degrees is ~550 m of latitude)
+AVOID_CELL_DEGREES = 0.005
+
+# Mean Earth radius (IUGG), for straight-line fallback distances
+EARTH_RADIUS_KM = 6371.0088
+
+# Adjacent route points closer than this many degrees (~1 m) are merged
+DEDUPE_EPSILON = 1e-5
+
+# Decimal places kept by the encoded-polyline route geometry (polyline6)
+POLYLINE_PRECISION = 6
+
+
+def haversine_km(start_lat, start_lon, end_lat, end_lon):
+    """
+    Great-circle distance in kilometers.
+    
+    Accepts scalars or NumPy arrays; arrays are computed elementwise in one pass.
+    """
+    start_lat, start_lon, end_lat, end_lon = map(np.radians, (start_lat, start_lon, end_lat, end_lon))
+    a = (
+        np.sin((end_lat - start_lat) / 2) ** 2
+        + np.cos(start_lat) * np.cos(end_lat) * np.sin((end_lon - start_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def dedupe_points(points: np.ndarray, eps: float = DEDUPE_EPSILON) -> np.ndarray:
+    """
+    Drop points that sit within eps degrees of the point before them.
+    
+    ORS geometries often repeat a vertex (snap-to-road artifacts); merging them
+    saves the downstream waypoint, risk and avoid-area work on each copy.
+    
+    Args:
+        points: (N, 2) array of coordinate pairs
+        eps: Merge distance in degrees
+    
+    Returns:
+        The points with adjacent near-duplicates removed; the first and last point
+        are always kept
+    """
+    if len(points) < 3:
+        return points
+    keep = np.empty(len(points), dtype=bool)
+    keep[0] = True
+    keep[1:] = np.linalg.norm(np.diff(points, axis=0), axis=1) > eps
+    keep[-1] = True
+    return points[keep]
+
+
+def encode_polyline(points: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """
+    Encode (lat, lon) points with Google's encoded polyline algorithm.
+    
+    The string is several times smaller than the same points as JSON floats.
+    
+    Args:
+        points: (N, 2) array of [lat, lon] pairs
+        precision: Decimal places to keep (6 matches ORS/OSRM "polyline6")
+    
+    Returns:
+        Encoded polyline string
+    """
+    if len(points) == 0:
+        return ""
+    scaled = np.rint(np.asarray(points, dtype=np.float64)[:, :2] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=0).ravel()
+    # Zigzag-encode the signed deltas, then split them into 5-bit chunks, least
+    # significant first, with 0x20 set on every chunk but the last of a value
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chunks = values[:, None] >> (5 * np.arange(8))
+    used = np.ones(chunks.shape, dtype=bool)
+    used[:, 1:] = chunks[:, 1:] != 0
+    more = np.zeros(chunks.shape, dtype=bool)
+    more[:, :-1] = used[:, 1:]
+    chars = (chunks & 0x1F) | np.where(more, 0x20, 0)
+    return (chars[used] + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Decode an encode_polyline() string back into [lat, lon] pairs."""
+    values = []
+    value = shift = 0
+    for char in encoded.encode("ascii"):
+        chunk = char - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if not chunk & 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return (coords / 10 ** precision).tolist()
+
+
+def _avoid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    """Grid cell containing a point."""
+    return (math.floor(lat / AVOID_CELL_DEGREES), math.floor(lon / AVOID_CELL_DEGREES))
+
+
+def avoid_cells(
+    points: Iterable[Tuple[float, float]],
+    exclude: Iterable[Tuple[float, float]] = ()
+) -> FrozenSet[Tuple[int, int]]:
+    """
+    Cluster (lat, lon) points into the set of grid cells to route around.
+    
+    Args:
+        points: High-risk (lat, lon) points
+        exclude: Points whose cells (and neighbouring cells) must stay routable, e.g. the
+            trip's start and end
+    
+    Returns:
+        Deduplicated grid cells; nearby points collapse into one cell
+    """
+    cells = {_avoid_cell(lat, lon) for lat, lon in points}
+    # Keep a one-cell margin around excluded points so they never sit on an avoid polygon's edge
+    for lat, lon in exclude:
+        row, col = _avoid_cell(lat, lon)
+        cells.difference_update(
+            (row + d_row, col + d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+        )
+    return frozenset(cells)
+
+
+@lru_cache(maxsize=1024)
+def avoid_polygons(cells: FrozenSet[Tuple[int, int]]) -> Dict[str, Any]:
+    """GeoJSON MultiPolygon of the given grid cells, for ORS options.avoid_polygons."""
+    polygons = []
+    for row, col in sorted(cells):
+        lat0, lon0 = round(row * AVOID_CELL_DEGREES, 6), round(col * AVOID_CELL_DEGREES, 6)
+        lat1, lon1 = round(lat0 + AVOID_CELL_DEGREES, 6), round(lon0 + AVOID_CELL_DEGREES, 6)
+        polygons.append([[[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]]])
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+@lru_cache(maxsize=None)
+def get_ors_client() -> Optional[openrouteservice.Client]:
+    """
+    Get the process-wide ORS client, or None when no API key is configured.
+    
+    All route agents share one client so its requests session keeps
+    connections to the ORS host alive between calls instead of re-handshaking.
+    """
+    if not config.ORS_API_KEY:
+        return None
+    client = openrouteservice.Client(key=config.ORS_API_KEY, timeout=10)
+    # Lookups run concurrently in worker threads, so allow more than the default
+    # 10 pooled connections per host
+    client._session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+    return client
+
+
+def _request_directions(
+    client,
+    start_lat: float,
+    start_lon: float,
+    end_lat: float,
+    end_lon: float,
+    profile: str,
+    alternatives: bool,
+    avoid: FrozenSet[Tuple[int, int]] = frozenset()
+) -> Dict[str, Any]:
+    """Call ORS directions, bypassing every cache."""
+    options = {"alternative_routes": ALTERNATIVE_ROUTES, "instructions": False} if alternatives else {}
+    if avoid:
+        options["options"] = {"avoid_polygons": avoid_polygons(avoid)}
+    return client.directions(
+        coordinates=[[start_lon, start_lat], [end_lon, end_lat]],
+        profile=profile,
+        format='geojson',
+        **options
+    )
+
+
+# One connection per process, shared by the lookup worker threads
+_disk_cache_lock = Lock()
+
+
+@lru_cache(maxsize=None)
+def _disk_cache() -> Optional[sqlite3.Connection]:
+    """Open the on-disk directions cache, or None when it is disabled or unusable."""
+    if not config.ORS_CACHE_PATH:
+        return None
+    try:
+        path = Path(config.ORS_CACHE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL lets several API workers read while one writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS directions "
+            "(key BLOB PRIMARY KEY, expires REAL NOT NULL, response BLOB NOT NULL)"
+        )
+        conn.execute("DELETE FROM directions WHERE expires < ?", (time.time(),))
+        return conn
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _stored_directions(client, *key) -> Dict[str, Any]:
+    """
+    Call ORS directions through the on-disk cache, so responses survive restarts.
+    
+    Entries are keyed by everything but the client and expire after
+    config.ORS_CACHE_TTL seconds. Disk errors fall through to a live request.
+    """
+    conn = _disk_cache()
+    if conn is None:
+        return _request_directions(client, *key)
+    
+    *trip, avoid = key
+    disk_key = orjson.dumps([*trip, sorted(avoid)])
+    try:
+        with _disk_cache_lock:
+            row = conn.execute(
+                "SELECT response FROM directions WHERE key = ? AND expires >= ?",
+                (disk_key, time.time())
+            ).fetchone()
+        if row is not None:
+            return orjson.loads(row[0])
+    except sqlite3.Error:
+        pass
+    
+    response = _request_directions(client, *key)
+    try:
+        with _disk_cache_lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO directions VALUES (?, ?, ?)",
+                (disk_key, time.time() + config.ORS_CACHE_TTL, orjson.dumps(response))
+            )
+    except sqlite3.Error:
+        pass
+    return response
+
+
+# Call ORS once per (client, rounded endpoints, profile, alternatives, avoid cells)
+# per process, backed by the disk cache across processes and restarts
+_cached_directions = lru_cache(maxsize=4096)(_stored_directions)
+
+
+def _directions_key(client, start_lat, start_lon, end_lat, end_lon, profile, alternatives, avoid) -> Tuple:
+    """Build the cache key for a directions lookup."""
+    return (
+        client,
+        round(start_lat, COORD_PRECISION),
+        round(start_lon, COORD_PRECISION),
+        round(end_lat, COORD_PRECISION),
+        round(end_lon, COORD_PRECISION),
+        profile,
+        alternatives,
+        avoid
+    )
+
+
+# In-flight async lookups by (event loop, cache key), so concurrent requests
+# for the same trip share one ORS call
+_inflight: Dict[Tuple, asyncio.Future] = {}
+
+
+async def fetch_directions(
+    client,
+    start_lat: float,
+    start_lon: float,
+    end_lat: float,
+    end_lon: float,
+    profile: str = "driving-car",
+    alternatives: bool = False,
+    avoid: FrozenSet[Tuple[int, int]] = frozenset(),
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Get ORS directions as GeoJSON, reusing earlier responses for the same trip.
+    
+    The blocking ORS call runs in a worker thread, and concurrent callers asking
+    for the same trip await one shared call instead of each hitting the API.
+    
+    Args:
+        client: openrouteservice.Client to query on a cache miss
+        start_lat: Start latitude
+        start_lon: Start longitude
+        end_lat: End latitude
+        end_lon: End longitude
+        profile: Route profile (driving-car, foot-walking, cycling-regular)
+        alternatives: Also request alternative routes
+        avoid: Grid cells from avoid_cells() to route around
+        use_cache: Use the in-process and on-disk directions caches; pass False
+            when the caller caches results itself
+    
+    Returns:
+        ORS GeoJSON response. It is shared between callers and must not be mutated.
+    """
+    lookup = _cached_directions if use_cache else _request_directions
+    key = _directions_key(client, start_lat, start_lon, end_lat, end_lon, profile, alternatives, avoid)
+    inflight_key = (asyncio.get_running_loop(), key)
+    
+    future = _inflight.get(inflight_key)
+    if future is None:
+        future = asyncio.ensure_future(asyncio.to_thread(lookup, *key))
+        _inflight[inflight_key] = future
+        future.add_done_callback(lambda f: _inflight.pop(inflight_key, None))
+    # Shield so one cancelled caller doesn't cancel the lookup for the others
+    return await asyncio.shield(future)
+
+
+# Geocoded addresses (normalized text -> (lat, lon)); addresses rarely move, so
+# entries live for config.GEOCODE_CACHE_TTL
+_geocode_cache: TTLCache = TTLCache(maxsize=4096, ttl=config.GEOCODE_CACHE_TTL)
+
+# In-flight geocoding lookups by (event loop, normalized address)
+_geocode_inflight: Dict[Tuple, asyncio.Future] = {}
+
+
+def _request_geocode(client, address: str) -> Optional[Tuple[float, float]]:
+    """Geocode an address with ORS (Pelias search); None when nothing matches."""
+    features = client.pelias_search(text=address, size=1).get("features") or []
+    if not features:
+        return None
+    lon, lat = features[0]["geometry"]["coordinates"][:2]
+    return lat, lon
+
+
+async def resolve_location(location: str) -> str:
+    """
+    Resolve a start or destination to a "lat,lon" string.
+    
+    Coordinates pass through unchanged. Addresses are geocoded with ORS in a
+    worker thread; results are cached, and concurrent lookups of the same
+    address share one ORS call.
+    
+    Args:
+        location: "lat,lon" or a free-form address
+    
+    Returns:
+        "lat,lon", or the input unchanged when it can't be resolved (no ORS
+        key, no match or an API error)
+    """
+    if COORD_RE.match(location):
+        return location
+    
+    address = " ".join(location.lower().split())
+    coords = _geocode_cache.get(address)
+    if coords is None:
+        client = get_ors_client()
+        if client is None or not address:
+            return location
+        
+        inflight_key = (asyncio.get_running_loop(), address)
+        future = _geocode_inflight.get(inflight_key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(_request_geocode, client, location))
+            _geocode_inflight[inflight_key] = future
+            future.add_done_callback(lambda f: _geocode_inflight.pop(inflight_key, None))
+        try:
+            coords = await asyncio.shield(future)
+        except Exception:
+            return location
+        if coords is None:
+            return location
+        _geocode_cache[address] = coords
+    
+    return f"{coords[0]},{coords[1]}"
@@ -1,16 +1,40 @@
 """Risk Scoring Agent for SafeRouteAI - computes combined risk scores."""
 from saferouteai.agents.agent_wrapper import Agent, Tool
-from google.generativeai import GenerativeModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import saferouteai.config as config
+import heapq
 import json
 
 
+# Risk factor names, in the order scores are passed around
+_FACTOR_NAMES = ("weather", "crime", "lighting", "time")
+
+_RISK_PROMPT_TMPL = """
+        Analyze the route risk based on the following safety data:
+        
+        Weather Risk: {weather_risk}
+        Crime Risk: {crime_risk}
+        Lighting Risk: {lighting_risk}
+        Time Risk: {time_risk}
+        
+        Total Risk Score: {total_risk_score}
+        Risk Level: {risk_level}
+        
+        Provide a detailed risk assessment explaining:
+        1. Why the route received this risk score
+        2. What factors contribute most to the risk
+        3. Specific safety concerns for this route
+        4. Whether the route should be avoided or if caution is sufficient
+        """
+
+
 class RiskScoringAgent:
     """Agent that computes combined risk scores from multiple safety factors."""
     
     def __init__(self):
+        from google.generativeai import GenerativeModel
         self.model = GenerativeModel(config.RISK_SCORING_MODEL)
+        self._risk_tool = self._create_risk_calculator_tool()
         
         self.agent = Agent(
             model=self.model,
@@ -35,7 +59,7 @@ class RiskScoringAgent:
             
             Always provide clear, justified risk assessments.
             """,
-            tools=[self._create_risk_calculator_tool()]
+            tools=[self._risk_tool]
         )
     
     def _create_risk_calculator_tool(self):
@@ -79,18 +103,9 @@ class RiskScoringAgent:
                 risk_level = "Hazardous"
                 risk_category = "high"
             
-            # Identify primary risk factors
-            risk_factors = {
-                "weather": weather_weighted,
-                "crime": crime_weighted,
-                "lighting": lighting_weighted,
-                "time": time_weighted
-            }
-            primary_risks = sorted(
-                risk_factors.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:2]  # Top 2 risk factors
+            # Identify primary risk factors (indices into _FACTOR_NAMES)
+            scores = (weather_weighted, crime_weighted, lighting_weighted, time_weighted)
+            top_indices = heapq.nlargest(2, range(4), key=scores.__getitem__)  # Top 2 risk factors
             
             return {
                 "success": True,
@@ -98,14 +113,12 @@ class RiskScoringAgent:
                 "risk_level": risk_level,
                 "risk_category": risk_category,
                 "risk_breakdown": {
-                    "weather": round(weather_weighted, 2),
-                    "crime": round(crime_weighted, 2),
-                    "lighting": round(lighting_weighted, 2),
-                    "time": round(time_weighted, 2)
+                    name: round(score, 2)
+                    for name, score in zip(_FACTOR_NAMES, scores)
                 },
                 "primary_risks": [
-                    {"factor": factor, "score": round(score, 2)}
-                    for factor, score in primary_risks
+                    {"factor": _FACTOR_NAMES[i], "score": round(scores[i], 2)}
+                    for i in top_indices
                 ],
                 "recommendation": (
                     "Route is safe to travel" if risk_category == "low" else
@@ -133,50 +146,72 @@ class RiskScoringAgent:
         Returns:
             Risk assessment with score and recommendations
         """
-        aggregated_risks = safety_data.get("aggregated_risks", {})
-        
-        weather_risk = aggregated_risks.get("weather", 0.5)
-        crime_risk = aggregated_risks.get("crime", 0.5)
-        lighting_risk = aggregated_risks.get("lighting", 0.5)
-        time_risk = aggregated_risks.get("time", 0.5)
+        weather_risk, crime_risk, lighting_risk, time_risk = risks = self._factor_risks(safety_data)
         
         # Calculate risk score
-        risk_result = self._create_risk_calculator_tool().function(
-            weather_risk,
-            crime_risk,
-            lighting_risk,
-            time_risk
+        risk_result = self._risk_tool.function(*risks)
+        
+        prompt = _RISK_PROMPT_TMPL.format(
+            weather_risk=weather_risk,
+            crime_risk=crime_risk,
+            lighting_risk=lighting_risk,
+            time_risk=time_risk,
+            total_risk_score=risk_result["total_risk_score"],
+            risk_level=risk_result["risk_level"]
         )
         
-        prompt = f"""
-        Analyze the route risk based on the following safety data:
+        response = await self.agent.run(prompt)
         
-        Weather Risk: {weather_risk}
-        Crime Risk: {crime_risk}
-        Lighting Risk: {lighting_risk}
-        Time Risk: {time_risk}
+        return self._assessment(risk_result, response.text, safety_data, "llm")
+    
+    def prefilter_route_risk(self, safety_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Score route risk without the LLM when the route is clearly safe.
         
-        Total Risk Score: {risk_result['total_risk_score']}
-        Risk Level: {risk_result['risk_level']}
+        The score itself is rule-based; the LLM only explains it, which adds
+        nothing but latency for a route whose factors are all low.
         
-        Provide a detailed risk assessment explaining:
-        1. Why the route received this risk score
-        2. What factors contribute most to the risk
-        3. Specific safety concerns for this route
-        4. Whether the route should be avoided or if caution is sufficient
-        """
+        Args:
+            safety_data: Aggregated safety data from SafetyDataAgent
         
-        response = await self.agent.run(prompt)
+        Returns:
+            Risk assessment shaped like score_route_risk's, or None when the
+            route isn't clearly safe and needs the full assessment
+        """
+        risk_result = self._risk_tool.function(*self._factor_risks(safety_data))
+        if risk_result["risk_category"] != "low":
+            return None
         
+        summary = (
+            f"Risk score {risk_result['total_risk_score']}/10 ({risk_result['risk_level']}): "
+            f"weather, crime, lighting and time risks are all low. {risk_result['recommendation']}."
+        )
+        return self._assessment(risk_result, summary, safety_data, "prefilter")
+    
+    @staticmethod
+    def _factor_risks(safety_data: Dict[str, Any]) -> Tuple[float, ...]:
+        """Aggregated risk per factor, in _FACTOR_NAMES order (0.5 when missing)."""
+        aggregated_risks = safety_data.get("aggregated_risks", {})
+        return tuple(aggregated_risks.get(name, 0.5) for name in _FACTOR_NAMES)
+    
+    @staticmethod
+    def _assessment(
+        risk_result: Dict[str, Any],
+        risk_assessment: str,
+        safety_data: Dict[str, Any],
+        source: str
+    ) -> Dict[str, Any]:
+        """Build the risk assessment result from a risk calculation."""
         return {
-            "risk_assessment": response.text,
+            "risk_assessment": risk_assessment,
             "risk_score": risk_result["total_risk_score"],
             "risk_level": risk_result["risk_level"],
             "risk_category": risk_result["risk_category"],
             "risk_breakdown": risk_result["risk_breakdown"],
             "primary_risks": risk_result["primary_risks"],
             "recommendation": risk_result["recommendation"],
-            "safety_data_summary": safety_data.get("summary", "")
+            "safety_data_summary": safety_data.get("summary", ""),
+            "source": source
         }
     
     def get_agent(self):
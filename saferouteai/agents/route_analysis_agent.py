@@ -1,18 +1,59 @@
 """Route Analysis Agent for SafeRouteAI."""
 from saferouteai.agents.agent_wrapper import Agent, Tool
-from google.generativeai import GenerativeModel
-from typing import Dict, Any, List, Tuple
+from saferouteai.agents.directions import (
+    COORD_RE, dedupe_points, encode_polyline, fetch_directions, get_ors_client, haversine_km
+)
+from typing import Dict, Any, List, Optional, Tuple
 import saferouteai.config as config
-import openrouteservice
-from geopy.distance import geodesic
+import numpy as np
+
+
+def _sample_indices(points: np.ndarray, max_points: int, min_turn_degrees: Optional[float]) -> np.ndarray:
+    """
+    Pick waypoint indices from an (N, 2) array of [lat, lon] points.
+    
+    Args:
+        points: Route points, N >= 1
+        max_points: Target number of sampled waypoints
+        min_turn_degrees: Heading-change threshold for turn-based sampling, or None
+            to sample evenly
+    
+    Returns:
+        Sorted int64 indices into points, always including the first and last point
+    """
+    last = len(points) - 1
+    
+    if len(points) <= max_points:
+        indices = np.arange(len(points))
+    elif min_turn_degrees is None:
+        # Sample evenly spaced waypoints
+        indices = np.arange(0, len(points), len(points) // max_points)
+    else:
+        # Heading of each segment, then the turn at each interior vertex wrapped to [0, pi]
+        deltas = np.diff(points, axis=0)
+        bearings = np.arctan2(deltas[:, 0], deltas[:, 1])
+        turns = np.abs((np.diff(bearings) + np.pi) % (2 * np.pi) - np.pi)
+        turn_indices = np.flatnonzero(turns > np.radians(min_turn_degrees))
+        keep = max(max_points - 2, 0)
+        if len(turn_indices) > keep:
+            sharpest = np.argpartition(turns[turn_indices], -keep)[-keep:] if keep else []
+            turn_indices = np.sort(turn_indices[sharpest])
+        indices = np.concatenate(([0], turn_indices + 1))
+    
+    # Always include start and end
+    if indices[-1] != last:
+        indices = np.append(indices, last)
+    return indices.astype(np.int64, copy=False)
 
 
 class RouteAnalysisAgent:
     """Agent that analyzes routes and extracts route information."""
     
     def __init__(self):
+        from google.generativeai import GenerativeModel
         self.model = GenerativeModel(config.ROUTE_ANALYSIS_MODEL)
-        self.client = openrouteservice.Client(key=config.ORS_API_KEY) if config.ORS_API_KEY else None
+        self.client = get_ors_client()
+        self._route_tool = self._create_route_tool()
         
         self.agent = Agent(
             model=self.model,
@@ -32,14 +73,14 @@ class RouteAnalysisAgent:
             
             Always provide clear, structured route information.
             """,
-            tools=[self._create_route_tool()]
+            tools=[self._route_tool]
         )
     
     def _create_route_tool(self):
         """Create tool for route planning."""
-        def get_route(start_lat: float, start_lon: float, 
-                     end_lat: float, end_lon: float, 
-                     profile: str = "driving-car") -> Dict[str, Any]:
+        async def get_route(start_lat: float, start_lon: float, 
+                           end_lat: float, end_lon: float, 
+                           profile: str = "driving-car") -> Dict[str, Any]:
             """
             Get route from start to destination.
             
@@ -55,7 +96,7 @@ class RouteAnalysisAgent:
             """
             if not self.client:
                 # Fallback: Calculate straight-line distance
-                distance_km = geodesic((start_lat, start_lon), (end_lat, end_lon)).kilometers
+                distance_km = float(haversine_km(start_lat, start_lon, end_lat, end_lon))
                 return {
                     "success": False,
                     "error": "ORS API key not configured",
@@ -73,11 +114,8 @@ class RouteAnalysisAgent:
                 }
             
             try:
-                coords = [[start_lon, start_lat], [end_lon, end_lat]]
-                route = self.client.directions(
-                    coordinates=coords,
-                    profile=profile,
-                    format='geojson'
+                route = await fetch_directions(
+                    self.client, start_lat, start_lon, end_lat, end_lon, profile
                 )
                 
                 # Extract route information
@@ -86,18 +124,25 @@ class RouteAnalysisAgent:
                 summary = properties.get('summary', {})
                 
                 # Convert coordinates to [lat, lon] format
-                route_coords = [[coord[1], coord[0]] for coord in geometry]
+                # Swap columns to [lat, lon] and merge repeated vertices; lists only
+                # at the response boundary
+                lat_lon = dedupe_points(np.asarray(geometry, dtype=np.float64)[:, 1::-1])
+                route_coords = lat_lon.tolist()
                 
-                return {
+                result = {
                     "success": True,
                     "distance_km": round(summary.get('distance', 0) / 1000, 2),
                     "duration_seconds": summary.get('duration', 0),
                     "duration_minutes": round(summary.get('duration', 0) / 60, 2),
                     "coordinates": route_coords,
-                    "waypoints": self._extract_waypoints(route_coords),
+                    "waypoints": self._extract_waypoints(lat_lon),
                     "route_type": profile,
                     "geometry": geometry
                 }
+                if config.ROUTE_POLYLINE:
+                    # Compact copy of the points for clients (decode with decode_polyline)
+                    result["geometry_polyline"] = encode_polyline(lat_lon)
+                return result
             except Exception as e:
                 return {
                     "success": False,
@@ -110,31 +155,35 @@ class RouteAnalysisAgent:
             function=get_route
         )
     
-    def _extract_waypoints(self, coordinates: List[List[float]], max_points: int = 10) -> List[Dict[str, Any]]:
-        """Extract key waypoints from route coordinates."""
-        if len(coordinates) <= max_points:
-            return [{"lat": coord[0], "lon": coord[1], "index": i} 
-                   for i, coord in enumerate(coordinates)]
+    def _extract_waypoints(
+        self,
+        coordinates: List[List[float]],
+        max_points: int = 10,
+        min_turn_degrees: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract key waypoints from route coordinates.
         
-        # Sample evenly spaced waypoints
-        step = len(coordinates) // max_points
-        waypoints = []
-        for i in range(0, len(coordinates), step):
-            waypoints.append({
-                "lat": coordinates[i][0],
-                "lon": coordinates[i][1],
-                "index": i
-            })
+        Args:
+            coordinates: Route coordinates as [lat, lon] pairs
+            max_points: Target number of sampled waypoints
+            min_turn_degrees: If set, keep the points where the heading changes by more
+                than this many degrees (sharpest turns first, up to max_points) instead
+                of sampling evenly
         
-        # Always include start and end
-        if waypoints[-1]["index"] != len(coordinates) - 1:
-            waypoints.append({
-                "lat": coordinates[-1][0],
-                "lon": coordinates[-1][1],
-                "index": len(coordinates) - 1
-            })
+        Returns:
+            Waypoints with lat, lon and index into coordinates; start and end always included
+        """
+        if len(coordinates) == 0:
+            return []
+        
+        points = np.asarray(coordinates, dtype=np.float64)[:, :2]
+        indices = _sample_indices(points, max_points, min_turn_degrees)
         
-        return waypoints
+        return [
+            {"lat": lat, "lon": lon, "index": i}
+            for (lat, lon), i in zip(points[indices].tolist(), indices.tolist())
+        ]
     
     async def analyze_route(self, start: str, destination: str, 
                            route_type: str = "driving-car") -> Dict[str, Any]:
@@ -149,23 +198,38 @@ class RouteAnalysisAgent:
         Returns:
             Route analysis with coordinates and metadata
         """
-        # For now, assume coordinates are provided as "lat,lon"
-        # In production, you'd geocode addresses here
-        try:
-            start_lat, start_lon = map(float, start.split(','))
-            end_lat, end_lon = map(float, destination.split(','))
-        except:
+        # Coordinates are expected as "lat,lon"; the orchestrator geocodes
+        # addresses (directions.resolve_location) before calling this
+        start_match = COORD_RE.match(start)
+        end_match = COORD_RE.match(destination)
+        if not start_match or not end_match:
             return {
                 "success": False,
                 "error": "Invalid coordinate format. Use 'lat,lon'"
             }
+        start_lat, start_lon = float(start_match.group(1)), float(start_match.group(2))
+        end_lat, end_lon = float(end_match.group(1)), float(end_match.group(2))
+        
+        # Fetch the route once and hand the result to the LLM as context,
+        # rather than asking it to look the route up again
+        route_data = await self._route_tool.function(
+            start_lat, start_lon, end_lat, end_lon, route_type
+        )
+        route_summary = route_data if not route_data.get("success") else {
+            "distance_km": route_data["distance_km"],
+            "duration_minutes": route_data["duration_minutes"],
+            "waypoints": route_data["waypoints"]
+        }
         
         prompt = f"""
         Analyze the route from {start} to {destination}.
         
-        Use the get_route tool to:
-        1. Get the route coordinates
-        2. Extract distance and duration
+        Route data from the get_route tool:
+        {route_summary}
+        
+        Using this data:
+        1. Summarize the route coordinates
+        2. Explain distance and duration
         3. Identify waypoints for safety analysis
         
         Route type: {route_type}
@@ -173,11 +237,6 @@ class RouteAnalysisAgent:
         
         response = await self.agent.run(prompt)
         
-        # Get route data from tool
-        route_data = self._create_route_tool().function(
-            start_lat, start_lon, end_lat, end_lon, route_type
-        )
-        
         return {
             "analysis": response.text,
             "route_data": route_data,
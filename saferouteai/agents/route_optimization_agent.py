@@ -1,18 +1,104 @@
 """Route Optimization Agent for SafeRouteAI - suggests safer alternative routes."""
 from saferouteai.agents.agent_wrapper import Agent, Tool
-from google.generativeai import GenerativeModel
+from saferouteai.agents.directions import (
+    COORD_PRECISION, avoid_cells, encode_polyline, fetch_directions, get_ors_client, haversine_km
+)
 from typing import Dict, Any, List, Optional
 import saferouteai.config as config
-import openrouteservice
-from geopy.distance import geodesic
+import asyncio
+from dataclasses import dataclass
+from threading import RLock
+from cachetools import TTLCache
+import numpy as np
+
+
+# Alternative routes by (rounded endpoints, profile, avoid cells), shared by
+# all agent instances; routes expire after ALT_ROUTE_CACHE_TTL seconds
+_alt_route_cache = TTLCache(maxsize=2048, ttl=config.ALT_ROUTE_CACHE_TTL)
+_alt_route_cache_lock = RLock()
+_alt_route_cache_stats = {"hits": 0, "misses": 0}
+
+
+# Response for routes below RISK_THRESHOLD_MODERATE (risk_score is filled in per call)
+_ACCEPTABLE_RESPONSE = {
+    "optimization_needed": False,
+    "message": "Route risk is acceptable, no optimization needed"
+}
+
+
+@dataclass(slots=True)
+class RouteComparison:
+    """Distance, time and risk of an original route against an alternative."""
+    original_km: float
+    alternative_km: float
+    original_minutes: float
+    alternative_minutes: float
+    original_risk: float
+    alternative_risk: float
+    
+    @classmethod
+    def from_routes(
+        cls,
+        original_route: Dict[str, Any],
+        alternative_route: Dict[str, Any],
+        original_risk: float,
+        alternative_risk: float
+    ) -> "RouteComparison":
+        """Build a comparison from two route data dicts and their risk scores."""
+        return cls(
+            original_route.get("distance_km", 0),
+            alternative_route.get("distance_km", 0),
+            original_route.get("duration_minutes", 0),
+            alternative_route.get("duration_minutes", 0),
+            original_risk,
+            alternative_risk
+        )
+    
+    @property
+    def risk_improvement(self) -> float:
+        return self.original_risk - self.alternative_risk
+    
+    @property
+    def is_better(self) -> bool:
+        """Alternative is meaningfully safer (more than 1 point lower risk)."""
+        return self.alternative_risk < self.original_risk and self.risk_improvement > 1.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Rounded, JSON-ready comparison in the compare_routes tool format."""
+        is_better = self.is_better
+        return {
+            "success": True,
+            "is_better": is_better,
+            "recommendation": "Use alternative route" if is_better else "Original route acceptable",
+            "comparison": {
+                "distance": {
+                    "original_km": round(self.original_km, 2),
+                    "alternative_km": round(self.alternative_km, 2),
+                    "difference_km": round(self.alternative_km - self.original_km, 2)
+                },
+                "time": {
+                    "original_minutes": round(self.original_minutes, 2),
+                    "alternative_minutes": round(self.alternative_minutes, 2),
+                    "difference_minutes": round(self.alternative_minutes - self.original_minutes, 2)
+                },
+                "risk": {
+                    "original_score": round(self.original_risk, 2),
+                    "alternative_score": round(self.alternative_risk, 2),
+                    "improvement": round(self.risk_improvement, 2)
+                }
+            }
+        }
 
 
 class RouteOptimizationAgent:
     """Agent that suggests safer alternative routes when risk is high."""
     
     def __init__(self):
+        from google.generativeai import GenerativeModel
         self.model = GenerativeModel(config.ROUTE_OPTIMIZATION_MODEL)
-        self.client = openrouteservice.Client(key=config.ORS_API_KEY) if config.ORS_API_KEY else None
+        self.client = get_ors_client()
+        self._alt_tool = self._create_alternative_route_tool()
+        self._cmp_tool = self._create_route_comparison_tool()
         
         self.agent = Agent(
             model=self.model,
@@ -33,15 +119,12 @@ class RouteOptimizationAgent:
             
             Always provide clear explanations for route recommendations.
             """,
-            tools=[
-                self._create_alternative_route_tool(),
-                self._create_route_comparison_tool()
-            ]
+            tools=[self._alt_tool, self._cmp_tool]
         )
     
     def _create_alternative_route_tool(self):
         """Create tool for finding alternative routes."""
-        def find_alternative_route(
+        async def find_alternative_route(
             start_lat: float,
             start_lon: float,
             end_lat: float,
@@ -65,7 +148,7 @@ class RouteOptimizationAgent:
             """
             if not self.client:
                 # Fallback: Return original route
-                distance_km = geodesic((start_lat, start_lon), (end_lat, end_lon)).kilometers
+                distance_km = float(haversine_km(start_lat, start_lon, end_lat, end_lon))
                 return {
                     "success": False,
                     "error": "ORS API key not configured",
@@ -79,17 +162,33 @@ class RouteOptimizationAgent:
                     }
                 }
             
+            # Cluster the areas into grid cells once; the cell set keys both caches and
+            # becomes the avoid polygons sent to ORS (start/end cells stay routable)
+            avoid = avoid_cells(
+                ((area["lat"], area["lon"]) for area in avoid_areas or ()),
+                exclude=((start_lat, start_lon), (end_lat, end_lon))
+            )
+            cache_key = (
+                round(start_lat, COORD_PRECISION),
+                round(start_lon, COORD_PRECISION),
+                round(end_lat, COORD_PRECISION),
+                round(end_lon, COORD_PRECISION),
+                profile,
+                avoid
+            )
+            with _alt_route_cache_lock:
+                cached = _alt_route_cache.get(cache_key)
+                _alt_route_cache_stats["hits" if cached is not None else "misses"] += 1
+            if cached is not None:
+                return cached
+            
             try:
-                coords = [[start_lon, start_lat], [end_lon, end_lat]]
-                
                 # Try to get alternative route
                 # OpenRouteService supports alternative routes via alternatives parameter
-                route = self.client.directions(
-                    coordinates=coords,
-                    profile=profile,
-                    format='geojson',
-                    alternatives=True,
-                    instructions=False
+                # (results are cached with a TTL below, not in the permanent directions cache)
+                route = await fetch_directions(
+                    self.client, start_lat, start_lon, end_lat, end_lon, profile,
+                    alternatives=True, avoid=avoid, use_cache=False
                 )
                 
                 # Get the alternative route (index 1 if available, otherwise original)
@@ -102,9 +201,11 @@ class RouteOptimizationAgent:
                 properties = alt_route.get('properties', {})
                 summary = properties.get('summary', {})
                 
-                route_coords = [[coord[1], coord[0]] for coord in geometry]
+                # Swap columns to [lat, lon]
+                lat_lon = np.asarray(geometry, dtype=np.float64)[:, 1::-1]
+                route_coords = lat_lon.tolist()
                 
-                return {
+                result = {
                     "success": True,
                     "distance_km": round(summary.get('distance', 0) / 1000, 2),
                     "duration_seconds": summary.get('duration', 0),
@@ -114,6 +215,12 @@ class RouteOptimizationAgent:
                     "is_alternative": len(route['features']) > 1,
                     "geometry": geometry
                 }
+                if config.ROUTE_POLYLINE:
+                    # Compact copy of the points for clients (decode with decode_polyline)
+                    result["geometry_polyline"] = encode_polyline(lat_lon)
+                with _alt_route_cache_lock:
+                    _alt_route_cache[cache_key] = result
+                return result
             except Exception as e:
                 return {
                     "success": False,
@@ -146,42 +253,12 @@ class RouteOptimizationAgent:
             Returns:
                 Route comparison analysis
             """
-            original_dist = original_route.get("distance_km", 0)
-            alt_dist = alternative_route.get("distance_km", 0)
-            original_time = original_route.get("duration_minutes", 0)
-            alt_time = alternative_route.get("duration_minutes", 0)
-            
-            distance_diff = alt_dist - original_dist
-            time_diff = alt_time - original_time
-            risk_improvement = original_risk - alternative_risk
-            
-            # Determine if alternative is better
-            is_better = alternative_risk < original_risk and risk_improvement > 1.0
-            
-            recommendation = "Use alternative route" if is_better else "Original route acceptable"
-            
-            return {
-                "success": True,
-                "is_better": is_better,
-                "recommendation": recommendation,
-                "comparison": {
-                    "distance": {
-                        "original_km": round(original_dist, 2),
-                        "alternative_km": round(alt_dist, 2),
-                        "difference_km": round(distance_diff, 2)
-                    },
-                    "time": {
-                        "original_minutes": round(original_time, 2),
-                        "alternative_minutes": round(alt_time, 2),
-                        "difference_minutes": round(time_diff, 2)
-                    },
-                    "risk": {
-                        "original_score": round(original_risk, 2),
-                        "alternative_score": round(alternative_risk, 2),
-                        "improvement": round(risk_improvement, 2)
-                    }
-                }
-            }
+            return RouteComparison.from_routes(
+                original_route,
+                alternative_route,
+                original_risk,
+                alternative_risk
+            ).to_dict()
         
         return Tool(
             name="compare_routes",
@@ -206,15 +283,10 @@ class RouteOptimizationAgent:
         Returns:
             Route optimization results with alternative suggestions
         """
-        risk_score = risk_assessment.get("risk_score", 0)
-        
         # Only optimize if risk is moderate or high
+        risk_score = risk_assessment.get("risk_score", 0)
         if risk_score < config.RISK_THRESHOLD_MODERATE:
-            return {
-                "optimization_needed": False,
-                "message": "Route risk is acceptable, no optimization needed",
-                "risk_score": risk_score
-            }
+            return {**_ACCEPTABLE_RESPONSE, "risk_score": risk_score}
         
         route_data = original_route.get("route_data", {})
         if not route_data.get("success"):
@@ -236,43 +308,54 @@ class RouteOptimizationAgent:
         
         # Identify high-risk areas to avoid
         primary_risks = risk_assessment.get("primary_risks", [])
+        primary_factors = {r["factor"] for r in primary_risks}
         avoid_areas = []
         
         # If crime is a primary risk, try to avoid those areas
-        if any(r["factor"] == "crime" for r in primary_risks):
+        if "crime" in primary_factors:
             # Sample waypoints from original route to avoid
             avoid_areas = waypoints[1:-1]  # Avoid intermediate waypoints
         
-        # Find alternative route
-        alt_route_tool = self._create_alternative_route_tool()
-        alternative_route = alt_route_tool.function(
-            start["lat"],
-            start["lon"],
-            end["lat"],
-            end["lon"],
-            avoid_areas,
-            route_data.get("route_type", "driving-car")
-        )
+        # Search candidate avoid sets concurrently, most avoiding first; the
+        # unconstrained alternative is only a fallback for when the risky areas
+        # can't be avoided.
+        candidate_avoid_sets = [avoid_areas, []] if avoid_areas else [[]]
+        profile = route_data.get("route_type", "driving-car")
+        candidates = await asyncio.gather(*(
+            self._alt_tool.function(
+                start["lat"],
+                start["lon"],
+                end["lat"],
+                end["lon"],
+                avoid_set,
+                profile
+            )
+            for avoid_set in candidate_avoid_sets
+        ))
+        found = [candidate for candidate in candidates if candidate.get("success")]
         
-        if not alternative_route.get("success"):
+        if not found:
             return {
                 "optimization_needed": True,
                 "error": "Could not find alternative route",
-                "fallback": alternative_route.get("fallback")
+                "fallback": candidates[0].get("fallback")
             }
         
+        # Safety over speed: take the candidate that avoids the most risky areas
+        alternative_route = found[0]
+        
         # Estimate alternative route risk (simplified - would need full safety analysis)
         # For demo, assume alternative is slightly safer
         estimated_alt_risk = max(0, risk_score - 1.5)
         
         # Compare routes
-        comparison_tool = self._create_route_comparison_tool()
-        comparison = comparison_tool.function(
+        route_comparison = RouteComparison.from_routes(
             route_data,
             alternative_route,
             risk_score,
             estimated_alt_risk
         )
+        comparison = route_comparison.to_dict()
         
         prompt = f"""
         Analyze the route optimization:
@@ -310,9 +393,15 @@ class RouteOptimizationAgent:
             "alternative_route": alternative_route,
             "comparison": comparison,
             "risk_improvement": comparison["comparison"]["risk"]["improvement"],
-            "should_use_alternative": comparison["is_better"]
+            "should_use_alternative": route_comparison.is_better
         }
     
+    @staticmethod
+    def get_cache_stats() -> Dict[str, int]:
+        """Get hit/miss counts and current size of the alternative-route cache."""
+        with _alt_route_cache_lock:
+            return {**_alt_route_cache_stats, "size": len(_alt_route_cache)}
+    
     def get_agent(self):
         """Get the underlying agent instance."""
         return self.agent
@@ -1,18 +1,120 @@
 """Safety Data Agent for SafeRouteAI - fetches crime, weather, and lighting data."""
 from saferouteai.agents.agent_wrapper import Agent, Tool
-from google.generativeai import GenerativeModel
-from typing import Dict, Any, List
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 import saferouteai.config as config
-import requests
+import asyncio
+import httpx
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 import json
+import numpy as np
+
+# Successful weather lookups by location rounded to 2 decimals (~1 km); nearby
+# waypoints and users share one OpenWeather call while conditions are fresh
+_WEATHER_CACHE = TTLCache(maxsize=4096, ttl=config.WEATHER_CACHE_TTL)
+
+# Sunrise/sunset (UTC) by (date, location rounded to 1 decimal); they only change
+# daily, so only the "is it dark now" check is recomputed per call
+_SUN_CACHE = TTLCache(maxsize=4096, ttl=86400)
+
+# In-flight upstream lookups by (event loop, endpoint, cache key), so concurrent
+# routes (e.g. a batch) that need the same uncached data share one request
+_INFLIGHT: Dict[Tuple, asyncio.Future] = {}
+
+# Weather risk by OpenWeather "main" condition
+_WEATHER_RISK = {
+    "rain": 2.0,
+    "thunderstorm": 2.0,
+    "snow": 2.0,
+    "extreme": 2.0,
+    "drizzle": 1.5,
+    "mist": 1.5,
+    "fog": 1.5
+}
+
+# (time_risk, period) for each hour of the day
+_HOUR_RISK = (
+    ((2.5, "late_night"),) * 6      # 0-5: 10 PM - 6 AM
+    + ((1.2, "rush_hour"),) * 3     # 6-8: morning rush
+    + ((0.5, "daytime"),) * 8       # 9-16
+    + ((1.2, "rush_hour"),)         # 17: evening rush
+    + ((1.5, "evening"),) * 4       # 18-21: 6 PM - 10 PM
+    + ((2.5, "late_night"),) * 2    # 22-23
+)
+# Same risks as an array, for vectorized lookups
+_HOUR_RISK_ARR = np.array([time_risk for time_risk, _ in _HOUR_RISK], dtype=np.float64)
+
+
+# Fallback crime assessment. It doesn't depend on the location, so with the
+# "fallback" data source every waypoint shares this one (read-only) result
+_FALLBACK_CRIME = {
+    "success": True,
+    "crime_risk": 0.5,
+    "note": "Using fallback crime assessment. Integrate real crime APIs for production.",
+    "radius_km": 1.0
+}
+
+# Upstream statuses worth retrying, and the backoff schedule (0.2 s, 0.4 s)
+_RETRY_STATUSES = frozenset({502, 503, 504})
+_MAX_RETRIES = 2
+_RETRY_BACKOFF_SECONDS = 0.2
+
+
+def assess_time_safety_array(hours) -> np.ndarray:
+    """
+    Time-of-day risk for many hours at once (e.g. along a trip timeline).
+    
+    Vectorized counterpart of the assess_time_safety tool: one table gather
+    instead of a Python call per hour.
+    
+    Args:
+        hours: Array-like of hours of day (wrapped modulo 24)
+    
+    Returns:
+        float64 array of time_risk values, same shape as hours
+    """
+    return _HOUR_RISK_ARR[np.asarray(hours, dtype=np.int64) % 24]
+
+
+async def _coalesced(key: Tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await fetch(), sharing one call between concurrent callers with the same key.
+    
+    Args:
+        key: (endpoint, cache key) identifying the lookup
+        fetch: Starts the lookup; only called when none is in flight
+    
+    Returns:
+        The lookup's result (shared between callers; don't mutate it)
+    """
+    inflight_key = (asyncio.get_running_loop(), *key)
+    future = _INFLIGHT.get(inflight_key)
+    if future is None:
+        future = asyncio.ensure_future(fetch())
+        _INFLIGHT[inflight_key] = future
+        future.add_done_callback(lambda f: _INFLIGHT.pop(inflight_key, None))
+    # Shield so one cancelled caller doesn't cancel the lookup for the others
+    return await asyncio.shield(future)
 
 
 class SafetyDataAgent:
     """Agent that fetches real-time safety data: crime, weather, lighting, traffic."""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        from google.generativeai import GenerativeModel
         self.model = GenerativeModel(config.SAFETY_DATA_MODEL)
+        # Reuse keep-alive connections across calls instead of a new handshake each
+        # time; HTTP/2 multiplexes the concurrent per-waypoint lookups per host
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            http2=True,
+            timeout=10,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+        self._weather_tool = self._create_weather_tool()
+        self._lighting_tool = self._create_lighting_tool()
+        self._crime_tool = self._create_crime_tool()
+        self._time_safety_tool = self._create_time_safety_tool()
         
         self.agent = Agent(
             model=self.model,
@@ -33,16 +135,35 @@ class SafetyDataAgent:
             Always provide accurate, real-time safety information.
             """,
             tools=[
-                self._create_weather_tool(),
-                self._create_lighting_tool(),
-                self._create_crime_tool(),
-                self._create_time_safety_tool()
+                self._weather_tool,
+                self._lighting_tool,
+                self._crime_tool,
+                self._time_safety_tool
             ]
         )
     
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET a JSON API over the pooled client, retrying transient failures.
+        
+        Connection errors and 502/503/504 responses are retried up to
+        _MAX_RETRIES times with exponential backoff; other errors raise at once.
+        """
+        for attempt in range(_MAX_RETRIES + 1):
+            try:
+                response = await self.http_client.get(url, params=params, timeout=10)
+            except httpx.TransportError:
+                if attempt == _MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+                    response.raise_for_status()
+                    return response.json()
+            await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+    
     def _create_weather_tool(self):
         """Create tool for weather data."""
-        def get_weather(lat: float, lon: float) -> Dict[str, Any]:
+        async def get_weather(lat: float, lon: float) -> Dict[str, Any]:
             """
             Get current weather conditions for a location.
             
@@ -64,6 +185,11 @@ class SafetyDataAgent:
                     }
                 }
             
+            cache_key = (round(lat, 2), round(lon, 2))
+            cached = _WEATHER_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+            
             try:
                 url = f"{config.OPENWEATHER_BASE_URL}/weather"
                 params = {
@@ -72,9 +198,7 @@ class SafetyDataAgent:
                     "appid": config.OPENWEATHER_API_KEY,
                     "units": "metric"
                 }
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
+                data = await _coalesced(("weather", cache_key), lambda: self._get_json(url, params))
                 
                 weather_main = data.get("weather", [{}])[0].get("main", "").lower()
                 temp = data.get("main", {}).get("temp", 20)
@@ -85,10 +209,9 @@ class SafetyDataAgent:
                 risk_factors = []
                 
                 # Rain/storm increases risk
-                if weather_main in ["rain", "thunderstorm", "snow", "extreme"]:
-                    risk_factors.append(2.0)
-                elif weather_main in ["drizzle", "mist", "fog"]:
-                    risk_factors.append(1.5)
+                condition_risk = _WEATHER_RISK.get(weather_main)
+                if condition_risk:
+                    risk_factors.append(condition_risk)
                 
                 # Extreme temperatures
                 if temp < 0 or temp > 35:
@@ -106,7 +229,7 @@ class SafetyDataAgent:
                 
                 weather_risk = sum(risk_factors) if risk_factors else 0.5
                 
-                return {
+                result = {
                     "success": True,
                     "condition": weather_main,
                     "temperature_c": round(temp, 1),
@@ -116,6 +239,8 @@ class SafetyDataAgent:
                     "risk_factor": min(weather_risk, 3.0),  # Cap at 3.0
                     "timestamp": datetime.now().isoformat()
                 }
+                _WEATHER_CACHE[cache_key] = result
+                return result
             except Exception as e:
                 return {
                     "success": False,
@@ -134,7 +259,7 @@ class SafetyDataAgent:
     
     def _create_lighting_tool(self):
         """Create tool for sunset/sunrise and lighting conditions."""
-        def get_lighting_conditions(lat: float, lon: float, date: str = None) -> Dict[str, Any]:
+        async def get_lighting_conditions(lat: float, lon: float, date: str = None) -> Dict[str, Any]:
             """
             Get sunrise/sunset times and current lighting conditions.
             
@@ -149,28 +274,35 @@ class SafetyDataAgent:
             if date is None:
                 date = datetime.now().strftime("%Y-%m-%d")
             
+            cache_key = (date, round(lat, 1), round(lon, 1))
+            sun_times = _SUN_CACHE.get(cache_key)
+            
             try:
-                url = config.SUNRISE_SUNSET_API
-                params = {
-                    "lat": lat,
-                    "lng": lon,
-                    "date": date,
-                    "formatted": 0
-                }
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("status") != "OK":
-                    raise Exception("API returned error status")
-                
-                results = data.get("results", {})
-                sunrise_utc = datetime.fromisoformat(results["sunrise"].replace("Z", "+00:00"))
-                sunset_utc = datetime.fromisoformat(results["sunset"].replace("Z", "+00:00"))
+                if sun_times is None:
+                    url = config.SUNRISE_SUNSET_API
+                    params = {
+                        "lat": lat,
+                        "lng": lon,
+                        "date": date,
+                        "formatted": 0
+                    }
+                    data = await _coalesced(("sun", cache_key), lambda: self._get_json(url, params))
+                    
+                    if data.get("status") != "OK":
+                        raise Exception("API returned error status")
+                    
+                    results = data.get("results", {})
+                    sun_times = _SUN_CACHE[cache_key] = (
+                        datetime.fromisoformat(results["sunrise"].replace("Z", "+00:00")),
+                        datetime.fromisoformat(results["sunset"].replace("Z", "+00:00"))
+                    )
+                sunrise_utc, sunset_utc = sun_times
                 
-                now = datetime.now()
-                # Simple check: if current time is between sunset and sunrise (next day), it's dark
-                is_dark = now.hour >= sunset_utc.hour or now.hour < sunrise_utc.hour
+                now = datetime.now().astimezone()
+                # Dark unless now falls between sunrise and sunset. Comparing aware
+                # instants is timezone-correct (the API times are UTC, now is local)
+                # and also handles days whose light period wraps local midnight.
+                is_dark = not (sunrise_utc <= now < sunset_utc)
                 
                 # Calculate lighting risk (dark = higher risk)
                 lighting_risk = 2.0 if is_dark else 0.5
@@ -214,6 +346,10 @@ class SafetyDataAgent:
             Returns:
                 Crime data and risk assessment
             """
+            if config.CRIME_DATA_SOURCE == "fallback" and radius_km == _FALLBACK_CRIME["radius_km"]:
+                # Shared between callers; must not be mutated
+                return _FALLBACK_CRIME
+            
             # Fallback implementation - in production, integrate with real crime APIs
             # Options: police.uk API, city crime datasets, Kaggle datasets
             
@@ -257,18 +393,7 @@ class SafetyDataAgent:
                 hour = datetime.now().hour
             
             # Risk increases during late night/early morning
-            if 22 <= hour or hour < 6:  # 10 PM - 6 AM
-                time_risk = 2.5
-                period = "late_night"
-            elif 18 <= hour < 22:  # 6 PM - 10 PM
-                time_risk = 1.5
-                period = "evening"
-            elif 6 <= hour < 9 or 17 <= hour < 18:  # Rush hours
-                time_risk = 1.2
-                period = "rush_hour"
-            else:  # Daytime
-                time_risk = 0.5
-                period = "daytime"
+            time_risk, period = _HOUR_RISK[hour % 24]
             
             return {
                 "success": True,
@@ -294,59 +419,63 @@ class SafetyDataAgent:
         Returns:
             Aggregated safety data
         """
+        safety_data = await self.collect_safety_data(route_coordinates)
+        return {"summary": await self.summarize_safety_data(safety_data), **safety_data}
+    
+    async def collect_safety_data(self, route_coordinates: List[List[float]]) -> Dict[str, Any]:
+        """
+        Fetch and aggregate safety data for the route waypoints, without the LLM summary.
+        
+        Args:
+            route_coordinates: List of [lat, lon] coordinates along route
+        
+        Returns:
+            Aggregated safety data (gather_safety_data's result minus "summary")
+        """
         # Sample waypoints (use every Nth coordinate to avoid too many API calls)
         sample_size = min(5, len(route_coordinates))
         step = max(1, len(route_coordinates) // sample_size)
         sampled_coords = route_coordinates[::step]
         
-        weather_data = []
-        lighting_data = []
-        crime_data = []
-        time_data = []
+        # Weather is per ~1 km tile (lat/lon rounded to 2 decimals, as in the weather
+        # cache), so look it up once per distinct tile and share it between the
+        # sampled points that fall in the same tile
+        tiles = np.round(np.asarray(sampled_coords, dtype=np.float64)[:, :2], 2)
+        _, tile_first, tile_of_point = np.unique(tiles, axis=0, return_index=True, return_inverse=True)
+        tile_coords = [sampled_coords[i] for i in tile_first.tolist()]
         
-        for coord in sampled_coords:
-            lat, lon = coord[0], coord[1]
-            
-            # Get weather
-            weather = self._create_weather_tool().function(lat, lon)
-            if weather.get("success"):
-                weather_data.append(weather)
-            
-            # Get lighting (only once, same for all points)
-            if not lighting_data:
-                lighting = self._create_lighting_tool().function(lat, lon)
-                if lighting.get("success"):
-                    lighting_data.append(lighting)
-            
-            # Get crime data
-            crime = self._create_crime_tool().function(lat, lon)
-            crime_data.append(crime)
-            
-            # Get time safety (only once)
-            if not time_data:
-                time_safety = self._create_time_safety_tool().function()
-                time_data.append(time_safety)
+        # Weather for every waypoint, crime for every waypoint and lighting (same
+        # for all points) are independent lookups, so fetch them all concurrently.
+        # The crime lookup is synchronous (a real crime API client would block),
+        # so it runs on the default thread pool to keep the event loop free.
+        weather_fn = self._weather_tool.function
+        lighting_fn = self._lighting_tool.function
+        crime_fn = self._crime_tool.function
+        first_lat, first_lon = sampled_coords[0][0], sampled_coords[0][1]
+        tile_weather, crime_data, lighting = await asyncio.gather(
+            asyncio.gather(*(weather_fn(coord[0], coord[1]) for coord in tile_coords)),
+            asyncio.gather(*(asyncio.to_thread(crime_fn, coord[0], coord[1]) for coord in sampled_coords)),
+            lighting_fn(first_lat, first_lon)
+        )
+        
+        weather_results = [tile_weather[i] for i in tile_of_point.reshape(-1).tolist()]
+        weather_data = [weather for weather in weather_results if weather.get("success")]
+        lighting_data = [lighting] if lighting.get("success") else []
+        time_data = [self._time_safety_tool.function()]
         
         # Aggregate data
-        avg_weather_risk = sum(w.get("risk_factor", 0.5) for w in weather_data) / len(weather_data) if weather_data else 0.5
-        avg_crime_risk = sum(c.get("crime_risk", 0.5) for c in crime_data) / len(crime_data) if crime_data else 0.5
+        weather_risks = np.fromiter(
+            (w.get("risk_factor", 0.5) for w in weather_data), dtype=np.float64, count=len(weather_data)
+        )
+        crime_risks = np.fromiter(
+            (c.get("crime_risk", 0.5) for c in crime_data), dtype=np.float64, count=len(crime_data)
+        )
+        avg_weather_risk = float(weather_risks.mean()) if weather_risks.size else 0.5
+        avg_crime_risk = float(crime_risks.mean()) if crime_risks.size else 0.5
         lighting_risk = lighting_data[0].get("lighting_risk", 0.5) if lighting_data else 0.5
         time_risk = time_data[0].get("time_risk", 0.5) if time_data else 0.5
         
-        prompt = f"""
-        Analyze the safety data gathered for the route:
-        - Weather risk: {avg_weather_risk}
-        - Crime risk: {avg_crime_risk}
-        - Lighting risk: {lighting_risk}
-        - Time risk: {time_risk}
-        
-        Provide a summary of safety factors affecting this route.
-        """
-        
-        response = await self.agent.run(prompt)
-        
         return {
-            "summary": response.text,
             "weather_data": weather_data,
             "lighting_data": lighting_data[0] if lighting_data else {},
             "crime_data": crime_data,
@@ -359,6 +488,35 @@ class SafetyDataAgent:
             }
         }
     
+    async def summarize_safety_data(self, safety_data: Dict[str, Any]) -> str:
+        """
+        Summarize collected safety data with the LLM.
+        
+        Args:
+            safety_data: Result of collect_safety_data
+        
+        Returns:
+            Summary of the safety factors affecting the route
+        """
+        aggregated_risks = safety_data["aggregated_risks"]
+        prompt = f"""
+        Analyze the safety data gathered for the route:
+        - Weather risk: {aggregated_risks["weather"]}
+        - Crime risk: {aggregated_risks["crime"]}
+        - Lighting risk: {aggregated_risks["lighting"]}
+        - Time risk: {aggregated_risks["time"]}
+        
+        Provide a summary of safety factors affecting this route.
+        """
+        
+        response = await self.agent.run(prompt)
+        return response.text
+    
+    async def aclose(self):
+        """Close the HTTP client if this agent created it (shared clients are left open)."""
+        if self._owns_http_client:
+            await self.http_client.aclose()
+    
     def get_agent(self):
         """Get the underlying agent instance."""
         return self.agent
@@ -1,5 +1,6 @@
 """Configuration file for SafeRouteAI system."""
 import os
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,6 +21,33 @@ RISK_SCORING_MODEL = "gemini-2.0-flash-exp"
 ROUTE_OPTIMIZATION_MODEL = "gemini-2.0-flash-exp"
 ALERT_MODEL = "gemini-2.0-flash-exp"
 
+# Routing Cache Configuration
+# Seconds an alternative route stays cached per (start, end, profile, avoid areas)
+ALT_ROUTE_CACHE_TTL = int(os.getenv("ALT_ROUTE_CACHE_TTL", "900"))
+# SQLite file that keeps ORS directions across restarts (empty disables it)
+ORS_CACHE_PATH = os.getenv("ORS_CACHE_PATH", ".cache/ors_directions.sqlite3")
+# Seconds a directions response stays in the on-disk cache
+ORS_CACHE_TTL = int(os.getenv("ORS_CACHE_TTL", "86400"))
+# Seconds a geocoded address stays cached
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", "604800"))
+# Also return each route's points as an encoded polyline ("geometry_polyline")
+ROUTE_POLYLINE = os.getenv("ROUTE_POLYLINE", "false").lower() in ("1", "true", "yes")
+
+# Safety Data Cache Configuration
+# Seconds weather conditions stay cached per ~1 km area
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+
+# Orchestrator Configuration
+# Routes analyzed at once by batch_analyze_routes; keep it under the slowest
+# upstream API's rate limit
+BATCH_CONCURRENCY = int(os.getenv("SAFEROUTE_BATCH_CONCURRENCY", "8"))
+# Consecutive failed routes after which a batch skips the rest, e.g. when the
+# routing API is down (0 disables it)
+BATCH_FAILURE_LIMIT = int(os.getenv("SAFEROUTE_BATCH_FAILURE_LIMIT", "5"))
+# Seconds a successful analysis is reused for the same start, destination and
+# route type (0 disables it)
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "300"))
+
 # API Endpoints
 ORS_BASE_URL = "https://api.openrouteservice.org/v2"
 OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
@@ -36,9 +64,25 @@ RISK_MAX_SCORE = 10
 # Other: Kaggle crime datasets or Google Places API
 CRIME_DATA_SOURCE = os.getenv("CRIME_DATA_SOURCE", "fallback")  # Options: "police_uk", "city_data", "kaggle", "fallback"
 
+# API Server Configuration
+# Comma-separated list of web origins allowed to call the REST API
+CORS_ALLOWED_ORIGINS = tuple(
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:8501").split(",")
+    if origin.strip()
+)
+# Uvicorn worker processes; each keeps its own orchestrator cache
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# orjson options for API responses, streamed events and stored sessions (the
+# same ones FastAPI's ORJSONResponse uses): NumPy values such as risk scores
+# serialize as numbers and non-string dict keys are stringified
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
 # Logging Configuration
 LOG_LEVEL = "INFO"
 ENABLE_TRACING = True
+# Most recent traces kept in memory per tracer (per-operation stats cover all traces)
+TRACE_MAX_ENTRIES = int(os.getenv("TRACE_MAX_ENTRIES", "10000"))
 
 
 
@@ -1,11 +1,71 @@
 """Session and Memory Management for SafeRouteAI."""
-import json
-import os
-from typing import Dict, Any, List, Optional
+import atexit
+import copy
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 from pathlib import Path
+import orjson
 import saferouteai.config as config
 
+# Seconds to coalesce session changes before writing them to disk
+FLUSH_DELAY_SECONDS = 2.0
+
+
+def _dumps(value: Any) -> str:
+    """Serialize a session value for storage (anything orjson can't handle falls back to str())."""
+    return orjson.dumps(value, default=str, option=config.ORJSON_OPTIONS).decode()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    prefs_json TEXT NOT NULL,
+    stats_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS routes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    payload_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS routes_by_session ON routes (session_id, id);
+"""
+
+# One connection (and the lock serializing its use) per database file, shared
+# by every SessionManager in the process. Flushes run on timer threads, so the
+# connection is used across threads.
+_connections: Dict[Path, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+# Managers to flush at exit. Held weakly so managers dropped by their owner
+# (e.g. orchestrators evicted from the API server's cache) can be freed; one
+# with unsaved changes stays referenced by its pending flush timer.
+_managers: "weakref.WeakSet[SessionManager]" = weakref.WeakSet()
+
+
+def _open_db(path: Path) -> Tuple[sqlite3.Connection, threading.Lock]:
+    """Get the shared connection to a session database, creating it on first use."""
+    with _connections_lock:
+        if path not in _connections:
+            db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            _connections[path] = (db, threading.Lock())
+        return _connections[path]
+
+
+@atexit.register
+def _flush_all():
+    """Write every live manager's unsaved changes."""
+    for manager in list(_managers):
+        manager._flush_dirty()
+
 
 class SessionManager:
     """Manages user sessions and long-term memory."""
@@ -14,36 +74,140 @@ class SessionManager:
         """
         Initialize session manager.
         
+        Sessions live in a SQLite database (WAL mode) under storage_path: one row
+        per session plus one row per analyzed route, so recording a route is an
+        INSERT rather than a rewrite of the whole history. Sessions are read on
+        first access, and changes are written back in batches (at most every
+        FLUSH_DELAY_SECONDS, and at exit).
+        
         Args:
             storage_path: Path to store session data
         """
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
         self.sessions: Dict[str, Dict] = {}
-        self._load_sessions()
+        self._dirty: Set[str] = set()
+        self._pending: List[Tuple[str, Tuple]] = []
+        self._flush_timer: Optional[threading.Timer] = None
+        # _lock guards the cached sessions and the write queue; _db_lock serializes
+        # use of the shared connection; _flush_lock keeps flushes in order.
+        # Acquire in that order: _flush_lock, then _lock, then _db_lock.
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._db, self._db_lock = _open_db((self.storage_path / "sessions.sqlite3").resolve())
+        _managers.add(self)
     
-    def _load_sessions(self):
-        """Load existing sessions from disk."""
-        session_files = list(self.storage_path.glob("session_*.json"))
-        for session_file in session_files:
-            try:
-                with open(session_file, 'r') as f:
-                    session_data = json.load(f)
-                    session_id = session_data.get("session_id")
-                    if session_id:
-                        self.sessions[session_id] = session_data
-            except Exception as e:
-                print(f"Error loading session {session_file}: {e}")
+    def _get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session, loading it from disk on first access."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self._load_session(session_id)
+                if session is not None:
+                    stats = session.setdefault("statistics", {})
+                    if "sum_risk" not in stats:
+                        # Saved before running totals were kept; backfill them once
+                        history = session.get("route_history", [])
+                        stats["sum_risk"] = float(sum(r.get("risk_score", 0) for r in history))
+                        stats["total_routes_analyzed"] = len(history)
+                        stats["high_risk_routes"] = sum(1 for r in history if r.get("risk_score", 0) >= 7)
+                    self.sessions[session_id] = session
+            return session
+    
+    def _load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Load one session from disk, or None if it was never saved."""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT created_at, updated_at, prefs_json, stats_json FROM sessions WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()
+                routes = row and self._db.execute(
+                    "SELECT payload_json FROM routes WHERE session_id = ? ORDER BY id",
+                    (session_id,)
+                ).fetchall()
+            if row is None:
+                return self._import_json_session(session_id)
+        except sqlite3.Error as e:
+            print(f"Error loading session {session_id}: {e}")
+            return None
+        
+        created_at, updated_at, prefs_json, stats_json = row
+        return {
+            "session_id": session_id,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "route_history": [orjson.loads(payload) for (payload,) in routes],
+            "user_preferences": orjson.loads(prefs_json),
+            "statistics": orjson.loads(stats_json)
+        }
+    
+    def _import_json_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Import a session saved by the older one-JSON-file-per-session store."""
+        session_file = self.storage_path / f"{session_id}.json"
+        try:
+            session = orjson.loads(session_file.read_bytes())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading session {session_file}: {e}")
+            return None
+        
+        self.sessions[session_id] = session
+        for route_entry in session.get("route_history", []):
+            self._queue_route(session_id, route_entry)
+        self._save_session(session_id)
+        return session
+    
+    def _queue_route(self, session_id: str, route_entry: Dict[str, Any]):
+        """Queue the INSERT for one route history entry."""
+        self._pending.append((
+            "INSERT INTO routes (session_id, ts, payload_json) VALUES (?, ?, ?)",
+            (session_id, route_entry.get("timestamp", ""), _dumps(route_entry))
+        ))
     
     def _save_session(self, session_id: str):
-        """Save session to disk."""
-        if session_id in self.sessions:
-            session_file = self.storage_path / f"{session_id}.json"
+        """Mark a session changed and schedule a write."""
+        with self._lock:
+            if session_id not in self.sessions:
+                return
+            self._dirty.add(session_id)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_DELAY_SECONDS, self._flush_dirty)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _flush_dirty(self):
+        """Write queued routes and every changed session in one transaction."""
+        with self._flush_lock:
+            # Snapshot under the lock, then write without holding it
+            with self._lock:
+                self._flush_timer = None
+                pending, self._pending = self._pending, []
+                dirty, self._dirty = self._dirty, set()
+                rows = [self._session_row(session_id) for session_id in dirty]
+            if not pending and not rows:
+                return
+            
             try:
-                with open(session_file, 'w') as f:
-                    json.dump(self.sessions[session_id], f, indent=2, default=str)
-            except Exception as e:
-                print(f"Error saving session {session_id}: {e}")
+                with self._db_lock, self._db:
+                    self._db.execute("BEGIN")
+                    for statement, params in pending:
+                        self._db.execute(statement, params)
+                    self._db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"Error saving sessions {sorted(dirty)}: {e}")
+    
+    def _session_row(self, session_id: str) -> Tuple:
+        """Build the sessions-table row for a cached session."""
+        session = self.sessions[session_id]
+        return (
+            session_id,
+            session["created_at"],
+            session["updated_at"],
+            _dumps(session["user_preferences"]),
+            _dumps(session["statistics"])
+        )
     
     def create_session(self, session_id: str) -> Dict[str, Any]:
         """
@@ -68,17 +232,22 @@ class SessionManager:
             "statistics": {
                 "total_routes_analyzed": 0,
                 "average_risk_score": 0.0,
-                "high_risk_routes": 0
+                "high_risk_routes": 0,
+                "sum_risk": 0.0
             }
         }
         
-        self.sessions[session_id] = session_data
-        self._save_session(session_id)
+        with self._lock:
+            self.sessions[session_id] = session_data
+            # A new session replaces any earlier one with the same ID
+            self._pending.append(("DELETE FROM routes WHERE session_id = ?", (session_id,)))
+            self._save_session(session_id)
         return session_data
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data."""
-        return self.sessions.get(session_id)
+        """Get a snapshot of session data."""
+        with self._lock:
+            return copy.deepcopy(self._get(session_id))
     
     def store_route_analysis(self, session_id: str, analysis: Dict[str, Any]):
         """
@@ -88,11 +257,6 @@ class SessionManager:
             session_id: Session identifier
             analysis: Complete route analysis result
         """
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        session = self.sessions[session_id]
-        
         # Add to history
         route_entry = {
             "timestamp": datetime.now().isoformat(),
@@ -104,38 +268,46 @@ class SessionManager:
             "duration_minutes": analysis.get("summary", {}).get("duration_minutes", 0)
         }
         
-        session["route_history"].append(route_entry)
-        
-        # Update statistics
-        stats = session["statistics"]
-        stats["total_routes_analyzed"] += 1
-        
-        # Update average risk score
-        risk_scores = [r["risk_score"] for r in session["route_history"]]
-        stats["average_risk_score"] = sum(risk_scores) / len(risk_scores) if risk_scores else 0.0
-        
-        # Count high risk routes
-        stats["high_risk_routes"] = sum(
-            1 for r in session["route_history"]
-            if r.get("risk_score", 0) >= 7
-        )
-        
-        session["updated_at"] = datetime.now().isoformat()
-        self._save_session(session_id)
+        with self._lock:
+            session = self._get(session_id) or self.create_session(session_id)
+            
+            session["route_history"].append(route_entry)
+            self._queue_route(session_id, route_entry)
+            
+            # Update statistics
+            # Keep running totals so each route updates the stats in O(1)
+            stats = session["statistics"]
+            risk_score = route_entry["risk_score"]
+            stats["total_routes_analyzed"] += 1
+            stats["sum_risk"] += risk_score
+            
+            # Update average risk score
+            stats["average_risk_score"] = stats["sum_risk"] / stats["total_routes_analyzed"]
+            
+            # Count high risk routes
+            if risk_score >= 7:
+                stats["high_risk_routes"] += 1
+            
+            session["updated_at"] = datetime.now().isoformat()
+            self._save_session(session_id)
     
     def get_session_history(self, session_id: str) -> List[Dict[str, Any]]:
         """Get route analysis history for a session."""
-        if session_id not in self.sessions:
-            return []
-        
-        return self.sessions[session_id].get("route_history", [])
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            
+            return list(session.get("route_history", []))
     
     def get_user_preferences(self, session_id: str) -> Dict[str, Any]:
         """Get user preferences for a session."""
-        if session_id not in self.sessions:
-            return {}
-        
-        return self.sessions[session_id].get("user_preferences", {})
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return {}
+            
+            return dict(session.get("user_preferences", {}))
     
     def update_user_preferences(
         self,
@@ -149,18 +321,18 @@ class SessionManager:
             session_id: Session identifier
             preferences: Dictionary of preference updates
         """
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        session = self.sessions[session_id]
-        session["user_preferences"].update(preferences)
-        session["updated_at"] = datetime.now().isoformat()
-        self._save_session(session_id)
+        with self._lock:
+            session = self._get(session_id) or self.create_session(session_id)
+            session["user_preferences"].update(preferences)
+            session["updated_at"] = datetime.now().isoformat()
+            self._save_session(session_id)
     
     def get_statistics(self, session_id: str) -> Dict[str, Any]:
         """Get session statistics."""
-        if session_id not in self.sessions:
-            return {}
-        
-        return self.sessions[session_id].get("statistics", {})
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return {}
+            
+            return dict(session.get("statistics", {}))
 
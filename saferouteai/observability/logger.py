@@ -1,11 +1,78 @@
 """Logging setup for SafeRouteAI."""
+import atexit
 import logging
+import queue
 import sys
+from datetime import date
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from datetime import datetime
 import saferouteai.config as config
 
 
+class _DailyFileHandler(logging.FileHandler):
+    """
+    Append to logs/saferouteai_YYYYMMDD.log, switching files when the date changes.
+    
+    Nothing is ever renamed or deleted, so several processes (API workers,
+    Streamlit) can log to the same directory without clobbering each other's files.
+    """
+    
+    def __init__(self, log_dir: Path):
+        self.log_dir = log_dir
+        self.day = date.today()
+        super().__init__(self._path(), mode="a", encoding="utf-8", delay=True)
+    
+    def _path(self) -> Path:
+        return self.log_dir / f"saferouteai_{self.day.strftime('%Y%m%d')}.log"
+    
+    def emit(self, record: logging.LogRecord):
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.close()
+            self.baseFilename = str(self._path().absolute())
+        super().emit(record)
+
+
+@lru_cache(maxsize=None)
+def _get_file_handler() -> logging.Handler:
+    """
+    Get the process-wide log file handler.
+    
+    All loggers share one handler writing to one file per day
+    (logs/saferouteai_YYYYMMDD.log).
+    """
+    log_dir = Path("./logs")
+    log_dir.mkdir(exist_ok=True)
+    
+    file_handler = _DailyFileHandler(log_dir)
+    file_handler.setLevel(logging.DEBUG)
+    file_format = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    file_handler.setFormatter(file_format)
+    return file_handler
+
+
+@lru_cache(maxsize=None)
+def _get_queue_handler() -> logging.Handler:
+    """
+    Get the process-wide handler that feeds the log file.
+    
+    Loggers only enqueue records; a background QueueListener thread does the
+    file writes, so logging from the async request path never blocks on disk.
+    The file handler and listener are created on first use.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, _get_file_handler(), respect_handler_level=True)
+    listener.start()
+    # Drain queued records to the file before the interpreter exits
+    atexit.register(listener.stop)
+    return QueueHandler(log_queue)
+
+
 def setup_logger(name: str, log_level: str = None) -> logging.Logger:
     """
     Setup logger with file and console handlers.
@@ -34,19 +101,8 @@ def setup_logger(name: str, log_level: str = None) -> logging.Logger:
     console_handler.setFormatter(console_format)
     logger.addHandler(console_handler)
     
-    # File handler
-    log_dir = Path("./logs")
-    log_dir.mkdir(exist_ok=True)
-    log_file = log_dir / f"saferouteai_{datetime.now().strftime('%Y%m%d')}.log"
-    
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.DEBUG)
-    file_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(file_format)
-    logger.addHandler(file_handler)
+    # File handler (shared by all loggers, written from a background thread)
+    logger.addHandler(_get_queue_handler())
     
     return logger
 
@@ -1,7 +1,9 @@
 """Tracing for SafeRouteAI agent operations."""
 import time
+from collections import deque
+from itertools import count
 from contextlib import contextmanager
-from typing import Dict, Any, Optional
+from typing import Deque, Dict, Any, Optional
 from datetime import datetime
 import saferouteai.config as config
 
@@ -9,9 +11,19 @@ import saferouteai.config as config
 class Tracer:
     """Simple tracer for agent operation timing and context."""
     
-    def __init__(self):
-        self.traces: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, max_traces: Optional[int] = None):
+        """
+        Initialize tracer.
+        
+        Args:
+            max_traces: Most recent traces to keep (defaults to config.TRACE_MAX_ENTRIES);
+                older ones are dropped but still count towards the operation stats
+        """
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=max_traces or config.TRACE_MAX_ENTRIES)
         self.enabled = config.ENABLE_TRACING
+        # Running per-operation duration stats, updated as each trace finishes
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._trace_ids = count(1)
     
     @contextmanager
     def trace(self, operation_name: str, metadata: Optional[Dict[str, Any]] = None):
@@ -26,28 +38,36 @@ class Tracer:
             yield
             return
         
-        trace_id = f"{operation_name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
-        start_time = time.time()
-        
+        # Only cheap numbers on the hot path; timestamps are formatted in get_traces
         trace_data = {
+            "trace_id": f"{operation_name}-{next(self._trace_ids)}",
             "operation": operation_name,
-            "start_time": datetime.now().isoformat(),
+            "start_ts": time.time(),
             "metadata": metadata or {}
         }
+        start_ns = time.perf_counter_ns()
         
         try:
             yield trace_data
         finally:
-            end_time = time.time()
-            duration = end_time - start_time
+            trace_data["duration_ns"] = time.perf_counter_ns() - start_ns
+            trace_data["status"] = "success"
             
-            trace_data.update({
-                "end_time": datetime.now().isoformat(),
-                "duration_seconds": round(duration, 4),
-                "status": "success"
-            })
+            self.traces.append(trace_data)
             
-            self.traces[trace_id] = trace_data
+            op_stats = self._stats.get(operation_name)
+            if op_stats is None:
+                op_stats = self._stats[operation_name] = {
+                    "count": 0,
+                    "total_duration": 0.0,
+                    "min_duration": float('inf'),
+                    "max_duration": 0.0
+                }
+            duration = trace_data["duration_ns"] / 1e9
+            op_stats["count"] += 1
+            op_stats["total_duration"] += duration
+            op_stats["min_duration"] = min(op_stats["min_duration"], duration)
+            op_stats["max_duration"] = max(op_stats["max_duration"], duration)
     
     def get_traces(self, operation_name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
         """
@@ -57,40 +77,36 @@ class Tracer:
             operation_name: Optional filter by operation name
         
         Returns:
-            Dictionary of traces
+            Dictionary of the retained traces by trace ID
         """
-        if operation_name:
-            return {
-                k: v for k, v in self.traces.items()
-                if v.get("operation") == operation_name
-            }
-        return self.traces
+        return {
+            trace["trace_id"]: self._format_trace(trace) for trace in self.traces
+            if not operation_name or trace["operation"] == operation_name
+        }
+    
+    @staticmethod
+    def _format_trace(trace: Dict[str, Any]) -> Dict[str, Any]:
+        """Render a raw trace with ISO timestamps and a duration in seconds."""
+        formatted = {
+            key: value for key, value in trace.items()
+            if key not in ("start_ts", "duration_ns")
+        }
+        formatted["start_time"] = datetime.fromtimestamp(trace["start_ts"]).isoformat()
+        if "duration_ns" in trace:
+            duration = trace["duration_ns"] / 1e9
+            formatted["end_time"] = datetime.fromtimestamp(trace["start_ts"] + duration).isoformat()
+            formatted["duration_seconds"] = round(duration, 4)
+        return formatted
     
     def get_operation_stats(self) -> Dict[str, Dict[str, Any]]:
         """Get statistics for each operation type."""
-        stats = {}
-        
-        for trace in self.traces.values():
-            op_name = trace.get("operation")
-            if op_name not in stats:
-                stats[op_name] = {
-                    "count": 0,
-                    "total_duration": 0.0,
-                    "avg_duration": 0.0,
-                    "min_duration": float('inf'),
-                    "max_duration": 0.0
-                }
-            
-            duration = trace.get("duration_seconds", 0)
-            stats[op_name]["count"] += 1
-            stats[op_name]["total_duration"] += duration
-            stats[op_name]["min_duration"] = min(stats[op_name]["min_duration"], duration)
-            stats[op_name]["max_duration"] = max(stats[op_name]["max_duration"], duration)
-        
-        # Calculate averages
-        for op_stats in stats.values():
-            if op_stats["count"] > 0:
-                op_stats["avg_duration"] = op_stats["total_duration"] / op_stats["count"]
-        
-        return stats
-
+        return {
+            op_name: {
+                "count": op_stats["count"],
+                "total_duration": op_stats["total_duration"],
+                "avg_duration": op_stats["total_duration"] / op_stats["count"],
+                "min_duration": op_stats["min_duration"],
+                "max_duration": op_stats["max_duration"]
+            }
+            for op_name, op_stats in self._stats.items()
+        }
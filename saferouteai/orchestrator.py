@@ -1,39 +1,78 @@
 """Multi-Agent Orchestrator for SafeRouteAI - coordinates all agents."""
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Callable, AsyncIterator, Awaitable, TYPE_CHECKING
 import asyncio
 from datetime import datetime
-import json
+import httpx
+from cachetools import TTLCache
 
-from saferouteai.agents.route_analysis_agent import RouteAnalysisAgent
-from saferouteai.agents.safety_data_agent import SafetyDataAgent
-from saferouteai.agents.risk_scoring_agent import RiskScoringAgent
-from saferouteai.agents.route_optimization_agent import RouteOptimizationAgent
-from saferouteai.agents.alert_agent import AlertAgent
+import saferouteai.config as config
 from saferouteai.memory.session_manager import SessionManager
-from saferouteai.observability.logger import setup_logger, get_logger
+from saferouteai.observability.logger import setup_logger
 from saferouteai.observability.tracer import Tracer
 
+if TYPE_CHECKING:
+    from saferouteai.agents.route_optimization_agent import RouteOptimizationAgent
+
+
+# Configured once at import and shared by every orchestrator
+logger = setup_logger("SafeRouteOrchestrator")
+
+# Pipeline steps reported to on_step, in order; each is also the result key
+# holding that step's output (used to replay a memoized analysis)
+_STEPS = ("route_analysis", "safety_data", "risk_assessment", "route_optimization", "safety_alert")
+
 
 class SafeRouteOrchestrator:
     """Orchestrates multiple agents to provide complete route safety analysis."""
     
-    def __init__(self, session_id: Optional[str] = None, enable_memory: bool = True):
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        enable_memory: bool = True,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
         """
         Initialize orchestrator with all agents.
         
         Args:
             session_id: Optional session ID for memory management
             enable_memory: Whether to enable session memory
+            http_client: Optional shared HTTP client for outbound API calls (one is
+                created, and closed by aclose(), if not given)
         """
-        self.logger = setup_logger("SafeRouteOrchestrator")
+        self.logger = logger
         self.tracer = Tracer()
         
-        # Initialize agents
+        # One pooled client for every agent's outbound calls, so TLS connections
+        # are set up once and reused across agents and routes
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            http2=True,
+            timeout=10,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+        
+        # Initialize agents. Imported here so importing this module (e.g. at
+        # Streamlit or API server start-up) doesn't load the agent stack yet.
+        from saferouteai.agents.directions import resolve_location
+        from saferouteai.agents.route_analysis_agent import RouteAnalysisAgent
+        from saferouteai.agents.safety_data_agent import SafetyDataAgent
+        from saferouteai.agents.risk_scoring_agent import RiskScoringAgent
+        from saferouteai.agents.alert_agent import AlertAgent
+        
+        self._resolve_location = resolve_location
         self.route_agent = RouteAnalysisAgent()
-        self.safety_agent = SafetyDataAgent()
+        self.safety_agent = SafetyDataAgent(http_client=self.http_client)
         self.risk_agent = RiskScoringAgent()
-        self.optimization_agent = RouteOptimizationAgent()
         self.alert_agent = AlertAgent()
+        # Only moderate/high-risk routes need optimization; built on first use
+        self._optimization_agent: Optional["RouteOptimizationAgent"] = None
+        
+        # (start, destination, route_type) -> analysis task; in-flight tasks are
+        # shared too, so concurrent identical requests run the pipeline once
+        self._analysis_cache: TTLCache = TTLCache(maxsize=512, ttl=config.ANALYSIS_CACHE_TTL)
+        # Callers currently awaiting each in-flight analysis task
+        self._analysis_waiters: Dict[asyncio.Task, int] = {}
         
         # Initialize session manager
         self.session_manager = SessionManager() if enable_memory else None
@@ -43,25 +82,98 @@ class SafeRouteOrchestrator:
             self.session_manager.create_session(self.session_id)
             self.logger.info(f"Created session: {self.session_id}")
     
+    @property
+    def optimization_agent(self) -> "RouteOptimizationAgent":
+        """Route optimization agent, created (and its module imported) on first use."""
+        if self._optimization_agent is None:
+            from saferouteai.agents.route_optimization_agent import RouteOptimizationAgent
+            self._optimization_agent = RouteOptimizationAgent()
+        return self._optimization_agent
+    
     async def analyze_route_safety(
         self,
         start: str,
         destination: str,
         route_type: str = "driving-car",
-        user_preferences: Optional[Dict[str, Any]] = None
+        user_preferences: Optional[Dict[str, Any]] = None,
+        on_step: Optional[Callable[[str, Any], None]] = None
     ) -> Dict[str, Any]:
         """
         Complete route safety analysis using multi-agent system.
         
+        Successful results are memoized per (start, destination, route_type) for
+        config.ANALYSIS_CACHE_TTL seconds, and concurrent calls for the same route
+        share one pipeline run. Memoized results are shared and must not be mutated.
+        
         Args:
             start: Start location (address or "lat,lon")
             destination: Destination location (address or "lat,lon")
             route_type: Type of route (driving-car, foot-walking, cycling-regular)
             user_preferences: Optional user preferences (risk tolerance, etc.)
+            on_step: Optional callback invoked with (step_name, step_output) as each agent finishes
         
         Returns:
             Complete safety analysis with all agent outputs
         """
+        key = (start, destination, route_type)
+        task = self._analysis_cache.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._run_analysis(start, destination, route_type, user_preferences, on_step)
+            )
+            self._analysis_cache[key] = task
+            task.add_done_callback(lambda done: self._forget_failed_analysis(key, done))
+            result = await self._await_analysis(task)
+        else:
+            self.logger.info(f"Reusing route analysis: {start} -> {destination}")
+            result = task.result() if task.done() else await self._await_analysis(task)
+            if on_step:
+                for step in _STEPS:
+                    if result.get(step) is not None:
+                        on_step(step, result[step])
+        
+        # Store in memory if enabled. This is an in-memory update plus a queued
+        # INSERT (SessionManager writes to disk in batches), so it stays inline
+        # and history reads right after the analysis always include it.
+        if self.session_manager and result.get("success"):
+            self.session_manager.store_route_analysis(self.session_id, result)
+            self.logger.info(f"Stored analysis in session: {self.session_id}")
+        
+        return result
+    
+    def _forget_failed_analysis(self, key: tuple, task: asyncio.Task):
+        """Drop a finished analysis from the memo unless it succeeded."""
+        if task.cancelled() or task.exception() is not None or not task.result().get("success"):
+            if self._analysis_cache.get(key) is task:
+                del self._analysis_cache[key]
+    
+    async def _await_analysis(self, task: asyncio.Task) -> Dict[str, Any]:
+        """
+        Await a shared analysis task.
+        
+        The task is shielded, so a cancelled caller doesn't cancel the run other
+        callers share; once every caller has been cancelled (e.g. a batch skipped
+        the route), the run itself is stopped.
+        """
+        self._analysis_waiters[task] = self._analysis_waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters = self._analysis_waiters.pop(task) - 1
+            if waiters:
+                self._analysis_waiters[task] = waiters
+            elif not task.done():
+                task.cancel()
+    
+    async def _run_analysis(
+        self,
+        start: str,
+        destination: str,
+        route_type: str,
+        user_preferences: Optional[Dict[str, Any]],
+        on_step: Optional[Callable[[str, Any], None]]
+    ) -> Dict[str, Any]:
+        """Run the full agent pipeline for one route (see analyze_route_safety)."""
         with self.tracer.trace("analyze_route_safety"):
             self.logger.info(f"Starting route analysis: {start} -> {destination}")
             
@@ -69,8 +181,13 @@ class SafeRouteOrchestrator:
                 # Step 1: Route Analysis Agent (Sequential)
                 with self.tracer.trace("route_analysis"):
                     self.logger.info("Step 1: Analyzing route...")
+                    # Geocode addresses (cached) to "lat,lon" for the route agent
+                    start_coords, destination_coords = await asyncio.gather(
+                        self._resolve_location(start),
+                        self._resolve_location(destination)
+                    )
                     route_result = await self.route_agent.analyze_route(
-                        start, destination, route_type
+                        start_coords, destination_coords, route_type
                     )
                     
                     route_data = route_result.get("route_data", {})
@@ -92,6 +209,9 @@ class SafeRouteOrchestrator:
                                 "details": route_result
                             }
                 
+                if on_step:
+                    on_step("route_analysis", route_result)
+                
                 # Step 2: Safety Data Agent (Parallel data gathering)
                 with self.tracer.trace("safety_data_gathering"):
                     self.logger.info("Step 2: Gathering safety data...")
@@ -103,32 +223,61 @@ class SafeRouteOrchestrator:
                             "error": "No route coordinates available"
                         }
                     
-                    safety_result = await self.safety_agent.gather_safety_data(route_coords)
+                    safety_data = await self.safety_agent.collect_safety_data(route_coords)
+                
+                # Step 3: Risk Scoring Agent (Parallel with the safety summary - both
+                # only need the aggregated risks, so their LLM calls overlap). Clearly
+                # safe routes are scored by the rules alone, skipping the risk LLM call.
+                self.logger.info("Step 3: Calculating risk score...")
+                risk_result = self.risk_agent.prefilter_route_risk(safety_data)
+                if risk_result is not None:
+                    safety_summary = await self._traced(
+                        "safety_data_summary", self.safety_agent.summarize_safety_data, safety_data
+                    )
+                else:
+                    safety_summary, risk_result = await asyncio.gather(
+                        self._traced("safety_data_summary", self.safety_agent.summarize_safety_data, safety_data),
+                        self._traced("risk_scoring", self.risk_agent.score_route_risk, safety_data)
+                    )
+                safety_result = {"summary": safety_summary, **safety_data}
+                risk_result["safety_data_summary"] = safety_summary
                 
-                # Step 3: Risk Scoring Agent (Sequential)
-                with self.tracer.trace("risk_scoring"):
-                    self.logger.info("Step 3: Calculating risk score...")
-                    risk_result = await self.risk_agent.score_route_risk(safety_result)
+                if on_step:
+                    on_step("safety_data", safety_result)
+                    on_step("risk_assessment", risk_result)
+                
+                # Step 5: Alert Agent (Parallel with optimization - the alert only needs
+                # the risk and route results; optimization details are added after)
+                self.logger.info("Step 5: Generating safety alert...")
+                alert_task = asyncio.create_task(
+                    self._traced("alert_generation", self.alert_agent.generate_alert, risk_result, route_result)
+                )
                 
                 # Step 4: Route Optimization Agent (Conditional - only if risk is high)
                 optimization_result = None
-                if risk_result.get("risk_score", 0) >= 4:  # Moderate or high risk
-                    with self.tracer.trace("route_optimization"):
+                try:
+                    if risk_result.get("risk_score", 0) >= 4:  # Moderate or high risk
                         self.logger.info("Step 4: Optimizing route...")
-                        optimization_result = await self.optimization_agent.optimize_route(
+                        optimization_result = await self._traced(
+                            "route_optimization",
+                            self.optimization_agent.optimize_route,
                             route_result,
                             risk_result,
                             safety_result
                         )
-                
-                # Step 5: Alert Agent (Sequential - final output)
-                with self.tracer.trace("alert_generation"):
-                    self.logger.info("Step 5: Generating safety alert...")
-                    alert_result = await self.alert_agent.generate_alert(
-                        risk_result,
-                        route_result,
+                        
+                        if on_step:
+                            on_step("route_optimization", optimization_result)
+                    
+                    alert_result = self.alert_agent.annotate_with_optimization(
+                        await alert_task,
                         optimization_result
                     )
+                finally:
+                    alert_task.cancel()
+                
+                if on_step:
+                    on_step("safety_alert", alert_result)
                 
                 # Compile complete result
                 result = {
@@ -152,11 +301,6 @@ class SafeRouteOrchestrator:
                     }
                 }
                 
-                # Store in memory if enabled
-                if self.session_manager:
-                    self.session_manager.store_route_analysis(self.session_id, result)
-                    self.logger.info(f"Stored analysis in session: {self.session_id}")
-                
                 self.logger.info(f"Route analysis complete. Risk score: {result['summary']['risk_score']}")
                 return result
                 
@@ -168,10 +312,61 @@ class SafeRouteOrchestrator:
                     "session_id": self.session_id
                 }
     
+    async def _traced(self, operation_name: str, step: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Await step(*args) inside its own tracer span (keeps per-step timings for concurrent steps).
+        
+        The coroutine is only created once this runs, so a task wrapping this
+        that is cancelled before it starts leaves no un-awaited coroutine behind.
+        """
+        with self.tracer.trace(operation_name):
+            return await step(*args)
+    
+    async def stream_route_safety(
+        self,
+        start: str,
+        destination: str,
+        route_type: str = "driving-car",
+        user_preferences: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Route safety analysis that yields each agent's output as soon as it is ready.
+        
+        Args:
+            start: Start location (address or "lat,lon")
+            destination: Destination location (address or "lat,lon")
+            route_type: Type of route (driving-car, foot-walking, cycling-regular)
+            user_preferences: Optional user preferences (risk tolerance, etc.)
+        
+        Yields:
+            {"step": name, "data": output} events, ending with step "complete"
+            carrying the full analysis result
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(
+            self.analyze_route_safety(
+                start,
+                destination,
+                route_type,
+                user_preferences,
+                on_step=lambda step, data: queue.put_nowait({"step": step, "data": data})
+            )
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            yield {"step": "complete", "data": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+    
     async def batch_analyze_routes(
         self,
         routes: List[Dict[str, str]],
-        route_type: str = "driving-car"
+        route_type: str = "driving-car",
+        max_concurrency: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Analyze multiple routes in parallel (Parallel agents pattern).
@@ -179,6 +374,8 @@ class SafeRouteOrchestrator:
         Args:
             routes: List of route dicts with 'start' and 'destination' keys
             route_type: Type of route
+            max_concurrency: Maximum number of routes analyzed at once
+                (defaults to config.BATCH_CONCURRENCY)
         
         Returns:
             List of analysis results
@@ -186,32 +383,88 @@ class SafeRouteOrchestrator:
         with self.tracer.trace("batch_analyze_routes"):
             self.logger.info(f"Batch analyzing {len(routes)} routes...")
             
-            tasks = [
-                self.analyze_route_safety(
-                    route["start"],
-                    route["destination"],
-                    route_type
-                )
-                for route in routes
-            ]
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Process results
-            processed_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    processed_results.append({
-                        "success": False,
-                        "error": str(result),
-                        "route": routes[i]
-                    })
-                else:
-                    processed_results.append(result)
+            processed_results: List[Optional[Dict[str, Any]]] = [None] * len(routes)
+            async for index, result in self.batch_analyze_routes_stream(routes, route_type, max_concurrency):
+                processed_results[index] = result
             
             self.logger.info(f"Batch analysis complete: {len(processed_results)} results")
             return processed_results
     
+    async def batch_analyze_routes_stream(
+        self,
+        routes: List[Dict[str, str]],
+        route_type: str = "driving-car",
+        max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Analyze multiple routes in parallel, yielding each result as soon as it is ready.
+        
+        Args:
+            routes: List of route dicts with 'start' and 'destination' keys
+            route_type: Type of route
+            max_concurrency: Maximum number of routes analyzed at once
+                (defaults to config.BATCH_CONCURRENCY)
+        
+        Yields:
+            (index into routes, analysis result) in completion order. After
+            config.BATCH_FAILURE_LIMIT consecutive failures the remaining
+            routes are cancelled and yielded as failed, so a batch against a
+            down backend returns quickly.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or config.BATCH_CONCURRENCY)
+        failure_limit = config.BATCH_FAILURE_LIMIT
+        
+        async def analyze_one(index: int, route: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return index, await self.analyze_route_safety(
+                        route["start"],
+                        route["destination"],
+                        route_type
+                    )
+                except Exception as e:
+                    return index, {
+                        "success": False,
+                        "error": str(e),
+                        "route": route
+                    }
+        
+        tasks = [asyncio.create_task(analyze_one(i, route)) for i, route in enumerate(routes)]
+        remaining = set(range(len(routes)))
+        consecutive_failures = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                remaining.discard(index)
+                yield index, result
+                
+                consecutive_failures = 0 if result.get("success") else consecutive_failures + 1
+                if failure_limit and consecutive_failures >= failure_limit and remaining:
+                    break
+            else:
+                return
+            
+            self.logger.warning(
+                f"Aborting batch after {consecutive_failures} consecutive failures; "
+                f"skipping {len(remaining)} remaining routes"
+            )
+            # Pipeline runs only this batch was waiting on stop with their route
+            # task; runs other callers share keep going
+            skipped = [index for index in sorted(remaining) if tasks[index].cancel()]
+            # Routes that finished in the meantime still report their real result
+            for index in sorted(remaining.difference(skipped)):
+                yield tasks[index].result()
+            for index in skipped:
+                yield index, {
+                    "success": False,
+                    "error": f"Skipped after {consecutive_failures} consecutive route failures",
+                    "route": routes[index]
+                }
+        finally:
+            # Only still-running routes are affected (the consumer stopped early)
+            for task in tasks:
+                task.cancel()
+    
     def get_session_history(self) -> List[Dict[str, Any]]:
         """Get route analysis history for current session."""
         if not self.session_manager:
@@ -231,4 +484,10 @@ class SafeRouteOrchestrator:
         if self.session_manager:
             self.session_manager.update_user_preferences(self.session_id, preferences)
             self.logger.info(f"Updated user preferences for session: {self.session_id}")
+    
+    async def aclose(self):
+        """Release network resources held by the agents."""
+        await self.safety_agent.aclose()
+        if self._owns_http_client:
+            await self.http_client.aclose()
 
@@ -4,22 +4,78 @@ Run: streamlit run streamlit_app.py
 """
 import streamlit as st
 import asyncio
+import json
+import threading
+import httpx
 from saferouteai import SafeRouteOrchestrator
 from datetime import datetime
 
+# (label, risk_breakdown key) for the risk breakdown metrics
+RISK_FACTORS = (("Weather", "weather"), ("Crime", "crime"), ("Lighting", "lighting"), ("Time", "time"))
+
 st.set_page_config(
     page_title="SafeRouteAI - Route Safety Advisor",
     page_icon="🚦",
     layout="wide"
 )
 
+
+@st.cache_resource
+def get_http_client() -> httpx.AsyncClient:
+    """Get the pooled HTTP client shared by every session's orchestrator."""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+
+
+@st.cache_resource
+def get_orchestrator(session_id: str) -> SafeRouteOrchestrator:
+    """Get a cached orchestrator so agents and their HTTP clients survive reruns."""
+    return SafeRouteOrchestrator(session_id=session_id, http_client=get_http_client())
+
+
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the background event loop that runs all agent calls.
+    
+    asyncio.run() would create and close a loop per click, breaking the cached
+    orchestrators' pooled connections, so every coroutine runs on this one loop.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+def iter_async(agen):
+    """Iterate an async generator on the shared event loop, one item at a time."""
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_async(agen.aclose())
+
+
 st.title("🚦 SafeRouteAI")
 st.subheader("Real-Time Route Safety Advisor - Multi-Agent System")
 
 # Sidebar
 with st.sidebar:
     st.header("⚙️ Configuration")
-    session_id = st.text_input("Session ID", value=f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    # Generate the default once per browser session; a new default on every
+    # rerun would reset the field and miss the orchestrator cache
+    if "default_session_id" not in st.session_state:
+        st.session_state.default_session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    session_id = st.text_input("Session ID", value=st.session_state.default_session_id)
     route_type = st.selectbox(
         "Route Type",
         ["driving-car", "foot-walking", "cycling-regular"],
@@ -63,8 +119,8 @@ with tab1:
         else:
             with st.spinner("Analyzing route with multi-agent system..."):
                 try:
-                    orchestrator = SafeRouteOrchestrator(session_id=session_id)
-                    result = asyncio.run(
+                    orchestrator = get_orchestrator(session_id)
+                    result = run_async(
                         orchestrator.analyze_route_safety(
                             start=start,
                             destination=destination,
@@ -93,15 +149,8 @@ with tab1:
                         # Risk breakdown
                         st.subheader("📊 Risk Breakdown")
                         risk_breakdown = result['risk_assessment'].get('risk_breakdown', {})
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("Weather", f"{risk_breakdown.get('weather', 0):.1f}")
-                        with col2:
-                            st.metric("Crime", f"{risk_breakdown.get('crime', 0):.1f}")
-                        with col3:
-                            st.metric("Lighting", f"{risk_breakdown.get('lighting', 0):.1f}")
-                        with col4:
-                            st.metric("Time", f"{risk_breakdown.get('time', 0):.1f}")
+                        for col, (label, key) in zip(st.columns(len(RISK_FACTORS)), RISK_FACTORS):
+                            col.metric(label, f"{risk_breakdown.get(key, 0):.1f}")
                         
                         # Safety alert
                         st.subheader("📢 Safety Alert")
@@ -130,26 +179,29 @@ with tab2:
     
     routes_text = st.text_area(
         "Routes (JSON format)",
-        value=str(example_routes),
+        value=json.dumps(example_routes, indent=2),
         height=150,
-        help="List of routes: [{'start': 'lat,lon', 'destination': 'lat,lon'}, ...]"
+        help='List of routes: [{"start": "lat,lon", "destination": "lat,lon"}, ...]'
     )
     
     if st.button("🔍 Analyze All Routes", type="primary"):
         try:
-            import json
             routes = json.loads(routes_text)
             
+            # One slot per route, filled in as each analysis finishes
+            st.subheader(f"📊 Results: {len(routes)} routes")
+            slots = []
+            for i, route in enumerate(routes):
+                with st.expander(f"Route {i+1}: {route.get('start', 'N/A')} → {route.get('destination', 'N/A')}"):
+                    slots.append(st.empty())
+                    slots[i].info("Analyzing...")
+            
             with st.spinner(f"Analyzing {len(routes)} routes in parallel..."):
-                orchestrator = SafeRouteOrchestrator(session_id=session_id)
-                results = asyncio.run(
-                    orchestrator.batch_analyze_routes(routes, route_type=route_type)
-                )
-                
-                # Display results
-                st.subheader(f"📊 Results: {len(results)} routes analyzed")
-                for i, result in enumerate(results):
-                    with st.expander(f"Route {i+1}: {result['summary'].get('start', 'N/A')} → {result['summary'].get('destination', 'N/A')}"):
+                orchestrator = get_orchestrator(session_id)
+                for i, result in iter_async(
+                    orchestrator.batch_analyze_routes_stream(routes, route_type=route_type)
+                ):
+                    with slots[i].container():
                         if result.get("success", False):
                             st.metric("Risk Score", f"{result['summary']['risk_score']}/10")
                             st.write(f"**Risk Level:** {result['summary']['risk_level']}")
@@ -165,8 +217,7 @@ with tab3:
     
     if st.button("📚 Load History"):
         try:
-            orchestrator = SafeRouteOrchestrator(session_id=session_id)
-            history = orchestrator.get_session_history()
+            history = get_orchestrator(session_id).get_session_history()
             
             if history:
                 st.subheader(f"📋 {len(history)} routes analyzed")
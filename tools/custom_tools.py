@@ -1,14 +1,25 @@
 """Custom tools for EduMentor agents."""
 from typing import Dict, List, Any
-from google.ai import agent
-import json
 import os
 from datetime import datetime
+import orjson
+
+
+def _write_file(filepath: str, data: bytes):
+    """Write a generated file in one call."""
+    with open(filepath, 'wb') as f:
+        f.write(data)
 
 
 class NoteGeneratorTool:
     """Tool for generating structured study notes."""
     
+    # Note templates by format; unknown formats fall back to the outline
+    _MD_TMPL = "# {topic}\n\n## Summary\n{content}\n\n## Key Points\n- Generated on {generated_at}\n"
+    _BULLET_TMPL = "# {topic}\n\n{content}\n\n## Quick Reference\n- Study Date: {study_date}\n"
+    _OUTLINE_TMPL = "# {topic}\n\n## Outline\n{content}\n"
+    _TEMPLATES = {"markdown": _MD_TMPL, "bullet": _BULLET_TMPL, "outline": _OUTLINE_TMPL}
+    
     def __init__(self, output_dir: str = "./notes"):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
@@ -25,21 +36,21 @@ class NoteGeneratorTool:
         Returns:
             Dictionary with note content and metadata
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         filename = f"{topic.replace(' ', '_')}_{timestamp}.md"
         filepath = os.path.join(self.output_dir, filename)
         
         # Structure notes based on format
-        if format_type == "markdown":
-            note_content = f"# {topic}\n\n## Summary\n{content}\n\n## Key Points\n- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        elif format_type == "bullet":
-            note_content = f"# {topic}\n\n{content}\n\n## Quick Reference\n- Study Date: {datetime.now().strftime('%Y-%m-%d')}\n"
-        else:  # outline
-            note_content = f"# {topic}\n\n## Outline\n{content}\n"
+        note_content = self._TEMPLATES.get(format_type, self._OUTLINE_TMPL).format(
+            topic=topic,
+            content=content,
+            generated_at=now.strftime('%Y-%m-%d %H:%M:%S'),
+            study_date=now.strftime('%Y-%m-%d')
+        )
         
         # Save to file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(note_content)
+        _write_file(filepath, note_content.encode('utf-8'))
         
         return {
             "success": True,
@@ -97,7 +108,8 @@ class QuizGeneratorTool:
         Returns:
             Dictionary with quiz content and metadata
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         filename = f"quiz_{topic.replace(' ', '_')}_{timestamp}.json"
         filepath = os.path.join(self.output_dir, filename)
         
@@ -106,12 +118,11 @@ class QuizGeneratorTool:
             "difficulty": difficulty,
             "questions": questions,
             "total_questions": len(questions),
-            "created_at": datetime.now().isoformat()
+            "created_at": now.isoformat()
         }
         
         # Save quiz
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(quiz_data, f, indent=2, ensure_ascii=False)
+        _write_file(filepath, orjson.dumps(quiz_data, option=orjson.OPT_INDENT_2))
         
         # Generate formatted quiz text
         quiz_text = f"# Quiz: {topic}\n\nDifficulty: {difficulty}\n\n"
@@ -181,25 +192,25 @@ class StudyPlannerTool:
         Returns:
             Dictionary with study plan structure
         """
+        # Distribute goals across duration
+        days_per_goal = max(1, duration_days // len(goals))
+        schedule = [
+            {
+                "goal": goal,
+                "day_range": f"{i * days_per_goal + 1}-{min((i + 1) * days_per_goal, duration_days)}",
+                "status": "pending"
+            }
+            for i, goal in enumerate(goals)
+        ]
+        
         plan = {
             "subject": subject,
             "goals": goals,
             "duration_days": duration_days,
             "created_at": datetime.now().isoformat(),
-            "schedule": []
+            "schedule": schedule
         }
         
-        # Distribute goals across duration
-        days_per_goal = max(1, duration_days // len(goals))
-        for i, goal in enumerate(goals):
-            start_day = i * days_per_goal + 1
-            end_day = min((i + 1) * days_per_goal, duration_days)
-            plan["schedule"].append({
-                "goal": goal,
-                "day_range": f"{start_day}-{end_day}",
-                "status": "pending"
-            })
-        
         return {
             "success": True,
             "plan": plan,